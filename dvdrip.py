@@ -121,24 +121,33 @@ Limitations:
 # 1-99)
 # TODO: Deal with failed scan of first title better.
 
-import ctypes
 import argparse
+import errno
+import importlib.util
 import stat
 import sys
 import time
 import glob
+import hashlib
+import json
 import os
+import queue
 import re
+import select
+import struct
 import subprocess
 import tempfile
+import threading
 
 try:
-    import tmdbsimple as tmdb
-    TMDB_AVAILABLE = True
+    import fcntl
 except ImportError:
-    TMDB_AVAILABLE = False
+    fcntl = None
+
+# Optional and rarely needed modules are imported where they're used, to
+# keep startup fast. tmdbsimple in particular pulls in requests.
+TMDB_AVAILABLE = importlib.util.find_spec('tmdbsimple') is not None
 
-from pprint import pprint
 from collections import namedtuple
 from math import gcd
 
@@ -156,28 +165,82 @@ def is_block_device(path: str) -> bool:
     except FileNotFoundError:
         return False
 
+MOUNTINFO_PATH = "/proc/self/mountinfo"
+
+def _unescape_mount_field(field: str) -> str:
+    # mountinfo escapes spaces, tabs, newlines and backslashes as \ooo.
+    return re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), field)
+
+def parse_mountinfo(text: str) -> list:
+    """
+    Parse the contents of /proc/self/mountinfo into a list of
+    (device number, source, mountpoint) tuples.
+    """
+    mounts = []
+    for line in text.splitlines():
+        fields = line.split()
+        try:
+            # Optional fields end at "-", followed by fstype and source.
+            sep = fields.index("-")
+            major, minor = fields[2].split(":")
+            mounts.append((os.makedev(int(major), int(minor)),
+                           _unescape_mount_field(fields[sep + 2]),
+                           _unescape_mount_field(fields[4])))
+        except (ValueError, IndexError):
+            continue
+    return mounts
+
+def mountinfo_mountpoint(devnode: str, mounts: list) -> str | None:
+    """
+    Return where devnode is mounted according to mounts (as returned by
+    parse_mountinfo), or None.
+    """
+    try:
+        st = os.stat(devnode)
+    except OSError:
+        return None
+    source = os.path.realpath(devnode)
+    for dev, mount_source, mountpoint in mounts:
+        if ((stat.S_ISBLK(st.st_mode) and dev == st.st_rdev)
+                or mount_source == source):
+            return mountpoint
+    return None
+
 def find_mountpoint(devnode: str) -> str | None:
     """
     Return mountpoint for devnode if mounted, else None.
     """
+    try:
+        with open(MOUNTINFO_PATH, "r") as f:
+            return mountinfo_mountpoint(devnode, parse_mountinfo(f.read()))
+    except OSError:
+        pass
     p = subprocess.run(["findmnt", "-n", "-o", "TARGET", "--source", devnode],
                        text=True, capture_output=True, check=False)
     mp = p.stdout.strip()
     return mp if p.returncode == 0 and mp else None
 
-def mount_device_readonly(devnode: str, timeout_sec: int = 20) -> str:
+def mount_device_readonly(devnode: str, timeout_sec: int = 20,
+                          loop: bool = False) -> str:
     """
     Mount devnode read-only to a temp dir and return that mount dir.
     Retries for up to timeout_sec because optical drives often need time
     to spin up / re-enumerate after USB resets.
+
+    With loop=True, devnode is a disc image file to loop-mount instead.
     """
     mount_dir = tempfile.mkdtemp(prefix="dvdrip_mount_")
     deadline = time.time() + float(timeout_sec)
     last_err = ""
+    options = "ro,loop" if loop else "ro"
+    delay = MOUNT_RETRY_MIN_SECONDS
 
     while time.time() < deadline:
+        if not loop:
+            # Don't try mounting until the drive has a disc ready to read.
+            wait_for_drive_ready(devnode, deadline)
         p = subprocess.run(
-            ["sudo", "mount", "-o", "ro", devnode, mount_dir],
+            ["sudo", "mount", "-o", options, devnode, mount_dir],
             text=True, capture_output=True, check=False
         )
         if p.returncode == 0:
@@ -193,7 +256,8 @@ def mount_device_readonly(devnode: str, timeout_sec: int = 20) -> str:
             "wrong fs type" in low
         )
         if transient:
-            time.sleep(1.0)
+            time.sleep(max(0.0, min(delay, deadline - time.time())))
+            delay = min(delay * 2, MOUNT_RETRY_MAX_SECONDS)
             continue
 
         break
@@ -205,6 +269,80 @@ def mount_device_readonly(devnode: str, timeout_sec: int = 20) -> str:
 
     raise RuntimeError(f"Failed to mount {devnode} read-only: {last_err}")
 
+def mountpoint_source(mountpoint: str) -> str | None:
+    """
+    Return the device mounted at mountpoint, or None.
+    """
+    try:
+        with open(MOUNTINFO_PATH, "r") as f:
+            mounts = parse_mountinfo(f.read())
+    except OSError:
+        return None
+    mountpoint = os.path.realpath(mountpoint)
+    for _, source, target in mounts:
+        if target == mountpoint:
+            return source
+    return None
+
+def release_mount(mountpoint: str) -> bool:
+    """
+    Unmount mountpoint, leaving the directory in place. Return whether it
+    was unmounted.
+    """
+    if os.geteuid() == 0:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.umount2(os.fsencode(mountpoint), 0) == 0:
+            return True
+    p = subprocess.run(["sudo", "umount", mountpoint],
+                       capture_output=True, check=False)
+    return p.returncode == 0
+
+def eject_device(devnode: str, deadline: float) -> bool:
+    """
+    Unlock the tray of devnode and eject it with the CD-ROM ioctls,
+    retrying with backoff until deadline. Return whether it was ejected.
+    """
+    delay = EJECT_RETRY_MIN_SECONDS
+    while True:
+        try:
+            fd = os.open(devnode, os.O_RDONLY | os.O_NONBLOCK)
+            try:
+                try:
+                    # Some drives come back locked after they've been read.
+                    fcntl.ioctl(fd, CDROM_LOCKDOOR, 0)
+                except OSError:
+                    pass
+                fcntl.ioctl(fd, CDROMEJECT)
+                return True
+            finally:
+                os.close(fd)
+        except OSError as exc:
+            if exc.errno == errno.ENOTTY:
+                # Not a drive that understands the ioctls.
+                return False
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, EJECT_RETRY_MAX_SECONDS)
+
+MOUNT_RETRY_MIN_SECONDS = 0.25
+MOUNT_RETRY_MAX_SECONDS = 2.0
+DRIVE_READY_POLL_SECONDS = 0.1
+
+def wait_for_drive_ready(devnode: str, deadline: float) -> None:
+    """
+    Wait until devnode reports a disc ready to read, or until deadline.
+
+    Returns at once for devices that can't report their status.
+    """
+    while time.time() < deadline:
+        status = _drive_status(devnode)
+        if status is None or status in (CDS_NO_INFO, CDS_DISC_OK):
+            return
+        time.sleep(DRIVE_READY_POLL_SECONDS)
+
 def unmount(mount_dir: str) -> None:
     subprocess.run(["sudo", "umount", mount_dir], check=False)
     try:
@@ -214,11 +352,14 @@ def unmount(mount_dir: str) -> None:
 
 def _udev_props(devnode: str) -> dict:
     # udevadm info --query=property --name=/dev/sr1
-    p = subprocess.run(
-        ["udevadm", "info", "--query=property", f"--name={devnode}"],
-        text=True, capture_output=True, check=False
-    )
     props = {}
+    try:
+        p = subprocess.run(
+            ["udevadm", "info", "--query=property", f"--name={devnode}"],
+            text=True, capture_output=True, check=False
+        )
+    except FileNotFoundError:
+        return props
     if p.returncode != 0:
         return props
     for line in p.stdout.splitlines():
@@ -227,39 +368,162 @@ def _udev_props(devnode: str) -> dict:
             props[k.strip()] = v.strip()
     return props
 
+# Linux CD-ROM ioctls, from <linux/cdrom.h>.
+CDROM_DRIVE_STATUS = 0x5326
+CDROMEJECT = 0x5309
+CDROM_LOCKDOOR = 0x5329
+CDSL_CURRENT = 0x7fffffff
+CDS_NO_INFO = 0
+CDS_DISC_OK = 4
+
+# How long auto-detection waits for a drive to answer before giving up on it.
+DRIVE_PROBE_TIMEOUT = 2.0
+
+def _sysfs_attr(devnode: str, attr: str) -> str | None:
+    name = os.path.basename(os.path.realpath(devnode))  # sr0
+    try:
+        with open(f"/sys/class/block/{name}/{attr}", "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def _is_optical_drive(devnode: str) -> bool:
+    # SCSI peripheral device type 5 is a CD/DVD drive.
+    dev_type = _sysfs_attr(devnode, "device/type")
+    if dev_type is not None:
+        return dev_type == "5"
+    return _udev_props(devnode).get("ID_CDROM") == "1"
+
+def _drive_status(devnode: str) -> int | None:
+    """
+    Return the CDROM_DRIVE_STATUS of devnode (one of the CDS_* values), or
+    None if the drive can't be asked.
+    """
+    if fcntl is None:
+        return None
+    try:
+        # O_NONBLOCK lets the open succeed when there is no disc.
+        fd = os.open(devnode, os.O_RDONLY | os.O_NONBLOCK)
+    except OSError:
+        return None
+    try:
+        return fcntl.ioctl(fd, CDROM_DRIVE_STATUS, CDSL_CURRENT)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
 def _device_has_media(devnode: str) -> bool:
     """
     Best-effort check that a disc is present and readable.
 
-    sysfs media != none is helpful but not sufficient on flaky USB drives,
-    so we also probe blkid which tends to fail when the disc isn't ready.
+    The drive is asked directly with the CDROM_DRIVE_STATUS ioctl, which
+    only reports a disc once the drive is ready to read it. Where that
+    isn't available, sysfs media != none is checked, and since that is not
+    sufficient on flaky USB drives, blkid is probed as well.
     """
-    name = os.path.basename(devnode)  # sr0
-    sys_media = f"/sys/class/block/{name}/device/media"
-    try:
-        with open(sys_media, "r") as f:
-            media = f.read().strip().lower()
-        if media in ("", "none"):
-            return False
-    except FileNotFoundError:
-        pass  # sysfs not available on this system, fall through to blkid
+    status = _drive_status(devnode)
+    if status is not None and status != CDS_NO_INFO:
+        return status == CDS_DISC_OK
+
+    media = _sysfs_attr(devnode, "device/media")
+    if media is not None and media.lower() in ("", "none"):
+        return False
 
     # Probe for a readable filesystem/descriptor. On DVD-Video (UDF/ISO),
     # blkid usually returns something when the disc is actually readable.
     p = subprocess.run(["blkid", devnode], text=True, capture_output=True, check=False)
     return p.returncode == 0
 
-def find_optical_drive_device(prefer_with_media: bool = True) -> str:
-    candidates = sorted(glob.glob("/dev/sr*"))
-    scored = []
+def disc_label(devnode: str) -> str | None:
+    """
+    Return the volume label of the disc in devnode, or None.
+    """
+    # DVD-Video discs carry an ISO 9660 primary volume descriptor in
+    # sector 16 alongside their UDF file system.
+    try:
+        with open(devnode, "rb") as f:
+            f.seek(16 * 2048)
+            descriptor = f.read(2048)
+        if descriptor[1:6] == b"CD001":
+            label = descriptor[40:72].decode("ascii", "replace").strip()
+            return label or None
+    except OSError:
+        pass
+    p = subprocess.run(["blkid", "-s", "LABEL", "-o", "value", devnode],
+                       text=True, capture_output=True, check=False)
+    label = p.stdout.strip()
+    return label if p.returncode == 0 and label else None
 
-    for dev in candidates:
-        props = _udev_props(dev)
-        if props.get("ID_CDROM") != "1":
-            continue
+def optical_drives() -> list:
+    return [dev for dev in sorted(glob.glob("/dev/sr*"))
+            if _is_optical_drive(dev)]
+
+def probe_optical_drives(timeout: float = DRIVE_PROBE_TIMEOUT) -> dict:
+    """
+    Return a dict mapping each optical drive to whether it has a readable
+    disc.
+
+    Drives are probed at the same time, and a drive that hasn't answered
+    within timeout seconds is reported as having no disc.
+    """
+    drives = optical_drives()
+    has_media = {}
+
+    def probe(dev):
+        has_media[dev] = _device_has_media(dev)
+
+    # Daemon threads, so a drive that hangs can't keep us from exiting.
+    threads = [threading.Thread(target=probe, args=(dev,), daemon=True)
+               for dev in drives]
+    for thread in threads:
+        thread.start()
+    deadline = time.time() + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.time()))
+    return {dev: has_media.get(dev, False) for dev in drives}
+
+NETLINK_KOBJECT_UEVENT = 15
+
+def open_uevent_socket():
+    """
+    Return a socket that receives kernel uevents (such as media changes on
+    optical drives), or None if they are not available.
+    """
+    import socket
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM,
+                             NETLINK_KOBJECT_UEVENT)
+        sock.bind((0, 1))
+    except (AttributeError, OSError):
+        return None
+    return sock
+
+def wait_for_uevent(sock, timeout: float) -> None:
+    """
+    Wait up to timeout seconds for a block device uevent on sock, or just
+    sleep if sock is None.
+    """
+    if sock is None:
+        time.sleep(timeout)
+        return
+    deadline = time.time() + timeout
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+            return
+        if b"SUBSYSTEM=block" in sock.recv(65536):
+            return
 
-        has_media = _device_has_media(dev)
+def find_optical_drive_device(prefer_with_media: bool = True) -> str:
+    drives = probe_optical_drives()
+    try:
+        default = os.path.realpath("/dev/cdrom")
+    except OSError:
+        default = None
+    scored = []
 
+    for dev, has_media in drives.items():
         # If we prefer media, skip drives that don't currently report readable media.
         if prefer_with_media and not has_media:
             continue
@@ -268,8 +532,8 @@ def find_optical_drive_device(prefer_with_media: bool = True) -> str:
         if has_media:
             score += 10
 
-        # Prefer the one that udev thinks is /dev/cdrom if present
-        if "/dev/cdrom" in props.get("DEVLINKS", ""):
+        # Prefer the one that /dev/cdrom points to if present
+        if dev == default:
             score += 2
 
         scored.append((score, dev))
@@ -280,7 +544,7 @@ def find_optical_drive_device(prefer_with_media: bool = True) -> str:
                 "No optical drive with readable media found under /dev/sr*. "
                 "Check the disc is inserted and the drive is stable."
             )
-        raise RuntimeError("No optical drive found under /dev/sr* (ID_CDROM=1).")
+        raise RuntimeError("No optical drive found under /dev/sr*.")
 
     scored.sort(reverse=True)
     return scored[0][1]
@@ -302,6 +566,150 @@ def check_output(*args, **kwargs):
 
 HANDBRAKE = 'HandBrakeCLI'
 
+PROGRESS_REGEX = re.compile(
+    r'Encoding: task (\d+) of (\d+), (\d+(?:\.\d+)?) %'
+    r'(?: \((\d+(?:\.\d+)?) fps, avg (\d+(?:\.\d+)?) fps, '
+    r'ETA (\d+)h(\d+)m(\d+)s\))?')
+
+# pass_number and pass_count count HandBrake's passes (eg: subtitle scan,
+# encode), percent is the progress of the current pass. fps, avg_fps and
+# eta (in seconds) are None until HandBrake has estimated them.
+Progress = namedtuple('Progress',
+        'pass_number pass_count percent fps avg_fps eta')
+
+def ParseProgress(line):
+    """
+    Parses a HandBrakeCLI progress line into a Progress, or returns None.
+    """
+    m = PROGRESS_REGEX.search(line)
+    if not m:
+        return None
+    pass_number, pass_count, percent, fps, avg_fps, h, m_, s = m.groups()
+    return Progress(int(pass_number), int(pass_count), float(percent),
+                    float(fps) if fps else None,
+                    float(avg_fps) if avg_fps else None,
+                    3600 * int(h) + 60 * int(m_) + int(s) if h else None)
+
+def RunEncoder(args, on_progress=None, log_path=None, verbose=False):
+    """
+    Runs HandBrakeCLI with args, streaming its stdout.
+
+    Progress lines are parsed and passed to on_progress. Everything else
+    goes to log_path if given, or to the terminal if verbose. Raises
+    subprocess.CalledProcessError if HandBrakeCLI fails.
+    """
+    log = open(log_path, 'wb') if log_path else None
+    try:
+        if log:
+            stderr = log
+        elif verbose:
+            stderr = None
+        else:
+            stderr = tempfile.TemporaryFile()
+        process = subprocess.Popen(args, stdout=subprocess.PIPE,
+                                   stderr=stderr)
+        pending = b''
+        # Whether the terminal's current line holds a progress update.
+        progress_shown = False
+        while True:
+            chunk = process.stdout.read1(4096)
+            pending += chunk
+            # HandBrake ends progress lines with a carriage return.
+            lines = re.split(rb'[\r\n]', pending)
+            pending = lines.pop() if chunk else b''
+            for line in lines:
+                text = line.decode(CHAR_ENCODING, 'replace')
+                progress = ParseProgress(text)
+                if progress:
+                    if on_progress:
+                        on_progress(progress)
+                    if verbose and not log:
+                        # Rewrite the progress line in place, as HandBrake
+                        # does on a terminal.
+                        sys.stdout.write('\r' + text)
+                        sys.stdout.flush()
+                        progress_shown = True
+                elif not text.strip():
+                    pass
+                elif log:
+                    log.write(line + b'\n')
+                elif verbose:
+                    if progress_shown:
+                        print()
+                        progress_shown = False
+                    print(text)
+            if not chunk:
+                break
+        if progress_shown:
+            print()
+        retcode = process.wait()
+        if retcode:
+            output = None
+            if stderr not in (log, None):
+                stderr.seek(0)
+                output = stderr.read()
+            raise subprocess.CalledProcessError(retcode, args, output=output)
+    finally:
+        if log:
+            log.close()
+
+# Encodes whose progress hasn't moved for this long are shown as stalled.
+STALL_SECONDS = 60
+
+class ProgressDisplay:
+    """
+    Shows the latest progress of every running encode on one status line.
+
+    Does nothing unless the stream is a terminal.
+    """
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self.enabled = self.stream.isatty()
+        self.lock = threading.Lock()
+        self.running = {}
+        self.ticker = None
+
+    def Update(self, label, progress):
+        with self.lock:
+            self.running[label] = (progress, time.time())
+            if self.enabled and self.ticker is None:
+                # Keeps redrawing so stalls show up without new progress.
+                self.ticker = threading.Thread(target=self.Tick, daemon=True)
+                self.ticker.start()
+            self.Render()
+
+    def Finish(self, label):
+        with self.lock:
+            self.running.pop(label, None)
+            self.Render()
+
+    def Tick(self):
+        while True:
+            time.sleep(1)
+            with self.lock:
+                if not self.running:
+                    self.ticker = None
+                    return
+                self.Render()
+
+    def Render(self):
+        if not self.enabled:
+            return
+        now = time.time()
+        parts = []
+        for label in sorted(self.running):
+            progress, updated = self.running[label]
+            part = '%s %5.1f%%' % (label, progress.percent)
+            if now - updated > STALL_SECONDS:
+                part += ' stalled %ds' % (now - updated)
+            elif progress.eta is not None:
+                part += ' %3.0ffps ETA %s' % (
+                        progress.fps, Duration.from_seconds(progress.eta))
+            parts.append('[%s]' % part)
+        # Return to the start of the line and clear it.
+        self.stream.write('\r\x1b[K' + ' '.join(parts))
+        self.stream.flush()
+
 TITLE_COUNT_REGEXES = [
         re.compile(r'^Scanning title \d+ of (\d+)\.\.\.$'),
         re.compile(r'^\[\d\d:\d\d:\d\d] scan: DVD has (\d+) title\(s\)$'),
@@ -400,6 +808,114 @@ def ParseNode(scan, pos, indent):
         node = value
     return pos, node
 
+TITLE_BLOCK_RE = re.compile(r'^\+ title (\d+):$')
+
+def SplitTitleScans(scan):
+    """
+    Splits the output of an all-titles scan into per-title blocks.
+
+    Returns a dict mapping title numbers to the structured lines of that
+    title, in the form ExtractTitleScan would return for a single-title scan.
+    Unstructured log lines interleaved with the title list end the current
+    block.
+    """
+    result = {}
+    block = None
+    for line in scan:
+        m = TITLE_BLOCK_RE.match(line.rstrip())
+        if m:
+            block = [line]
+            result[int(m.group(1))] = block
+        elif block is not None:
+            if line.startswith(' ') and STRUCTURED_LINE_RE.match(line):
+                block.append(line)
+            else:
+                block = None
+    return {number: tuple(lines) for number, lines in result.items()}
+
+def MakeTitle(name, number, info):
+    """
+    Builds a Title from the parsed text scan of title number.
+    """
+    assert ('title %d' % number) == name
+    return Title(
+        number=number,
+        duration=ExtractDuration('duration ' + info['duration']),
+        size=ParseSize(info['size']),
+        chapters=tuple(ParseChapters(info['chapters'])),
+        audio_tracks=tuple(ParseAudioTracks(info['audio tracks'])),
+        subtitle_tracks=tuple(ParseSubtitleTracks(info['subtitle tracks'])))
+
+JSON_TITLE_SET_MARKER = 'JSON Title Set:'
+
+def ExtractJsonTitleSet(output):
+    """
+    Returns the decoded "JSON Title Set" object from the stdout of
+    HandBrakeCLI --json --scan, or None if there isn't one.
+    """
+    pos = output.find(JSON_TITLE_SET_MARKER)
+    if pos < 0:
+        return None
+    start = output.find('{', pos)
+    if start < 0:
+        return None
+    try:
+        title_set, _ = json.JSONDecoder().raw_decode(output, start)
+    except ValueError:
+        return None
+    return title_set
+
+def JsonDuration(d):
+    return Duration(d['Hours'], d['Minutes'], d['Seconds'])
+
+JSON_CHANNELS_RE = re.compile(r'\((\d+\.\d+) ch\)')
+
+def JsonChannels(audio):
+    """
+    Returns the channels of a JSON audio track the way the text scan
+    reports them (eg: '2.0', '5.1').
+    """
+    if 'ChannelCount' in audio:
+        lfe = audio.get('LFECount', 0)
+        return '%d.%d' % (audio['ChannelCount'] - lfe, lfe)
+    m = JSON_CHANNELS_RE.search(audio.get('Description', ''))
+    if not m:
+        raise ValueError('No channel count for audio track %r' % audio)
+    return m.group(1)
+
+def ParseJsonTitle(number, t):
+    """
+    Builds a Title from one entry of a JSON title set's TitleList.
+    """
+    geometry = t['Geometry']
+    frame_rate = t['FrameRate']
+    size = Size(geometry['Width'], geometry['Height'],
+                geometry['PAR']['Num'], geometry['PAR']['Den'],
+                frame_rate['Num'] / frame_rate['Den'])
+
+    chapters = tuple(
+        Chapter(i, JsonDuration(chapter['Duration']))
+        for i, chapter in enumerate(t.get('ChapterList', []), 1))
+
+    audio_tracks = []
+    for i, audio in enumerate(t.get('AudioList', []), 1):
+        extras = '%dHz' % audio['SampleRate']
+        if audio.get('BitRate'):
+            extras += ', %dbps' % audio['BitRate']
+        audio_tracks.append(AudioTrack(i, audio['Language'],
+                audio['CodecName'], JsonChannels(audio),
+                audio['LanguageCode'], extras))
+
+    subtitle_tracks = tuple(
+        SubtitleTrack(i, '%s (iso639-2: %s) (%s)(%s)' % (
+                subtitle['Language'], subtitle['LanguageCode'],
+                'Bitmap' if subtitle.get('Format') == 'bitmap' else 'Text',
+                subtitle.get('SourceName', 'Unknown')))
+        for i, subtitle in enumerate(t.get('SubtitleList', []), 1))
+
+    return Title(number, JsonDuration(t['Duration']), size, chapters,
+                 tuple(audio_tracks), subtitle_tracks)
+
 def only(iterable):
     """
     Return the one and only element in iterable.
@@ -409,11 +925,13 @@ def only(iterable):
     result, = iterable
     return result
 
-Title = namedtuple('Title', ['number', 'info'])
+Title = namedtuple('Title', ['number', 'duration', 'size', 'chapters',
+                             'audio_tracks', 'subtitle_tracks'])
 Task = namedtuple('Task', ['title', 'chapter'])
 
 TOTAL_EJECT_SECONDS = 5
-EJECT_ATTEMPTS_PER_SECOND = 10
+EJECT_RETRY_MIN_SECONDS = 0.1
+EJECT_RETRY_MAX_SECONDS = 1.0
 
 class DVD:
     def __init__(self, mountpoint, verbose, mount_timeout=0):
@@ -422,21 +940,49 @@ class DVD:
         if not os.path.isdir(mountpoint):
             raise UserError('%r is not a directory' % mountpoint)
         self.mountpoint = mountpoint
+        # Where the disc itself lives, even after it has been staged.
+        self.disc_path = mountpoint
         self.verbose = verbose
+        # The number of titles the disc claims to have, once scanned.
+        self.title_count = None
+
+    def Stage(self, stage_dir, verbose):
+        """
+        Copies the disc to stage_dir and reads from the copy from now on.
+
+        Returns whether the disc was staged.
+        """
+        staged = StageDisc(self.disc_path, stage_dir, verbose)
+        if staged is None:
+            return False
+        self.mountpoint = staged
+        return True
 
-    def RipTitle(self, task, output, dry_run, verbose, no_subtitles=False):
+    def RipTitle(self, task, output, dry_run, verbose, no_subtitles=False,
+                 log_path=None, markers=False, input_path=None,
+                 on_progress=None):
+        """
+        Encodes task into output.
+
+        Each progress update of the encode is passed to on_progress as a
+        Progress. If log_path is given, all other HandBrakeCLI output is
+        written there instead of to the terminal. If markers is set, chapter markers are
+        written, which also makes HandBrake start a keyframe at every
+        chapter. If input_path is given, the stream in that file is encoded
+        instead of the title on the disc.
+        """
         if verbose:
             print('Title Scan:')
-            pprint(task.title.info)
+            from pprint import pprint
+            pprint(task.title._asdict())
             print('-' * 78)
 
-        audio_tracks = list(task.title.info['audio tracks'].keys())
-        subtitles = list(task.title.info['subtitle tracks'].keys())
+        subtitles = [str(sub.number) for sub in task.title.subtitle_tracks]
 
         args = [
             HANDBRAKE,
-            '--input', self.mountpoint,
-            '--title', str(task.title.number),
+            '--input', input_path or self.mountpoint,
+            '--title', '1' if input_path else str(task.title.number),
 
             '--encoder', 'x265',
             '--quality', '16',
@@ -455,9 +1001,14 @@ class DVD:
 
         if task.chapter is not None:
             args += ['--chapters', str(task.chapter)]
+        if markers:
+            args += ['--markers']
 
         if no_subtitles:
             args += ['--subtitle', 'none']
+        elif input_path:
+            # Track numbers of a bare stream needn't match the disc's.
+            args += ['--all-subtitles']
         elif subtitles:
             args += ['--subtitle', ','.join(subtitles)]
 
@@ -468,12 +1019,75 @@ class DVD:
                 if a.startswith('-') else a for a in args))
             print('-' * 78)
         if not dry_run:
-            if verbose:
-                subprocess.call(args)
-            else:
-                check_err(args)
+            RunEncoder(args, on_progress=on_progress, log_path=log_path,
+                       verbose=verbose)
+
+    def RipChapters(self, tasks, outputs, dry_run, verbose,
+                    no_subtitles=False, log_path=None, on_progress=None):
+        """
+        Encodes the chapter tasks of one title with a single encode.
+
+        The whole title is encoded once with chapter markers, then each
+        chapter is cut out of it into its output with a stream copy.
+        """
+        title = tasks[0].title
+        output_dir = os.path.dirname(outputs[0]) or '.'
+        full_output = os.path.join(output_dir,
+                                   '.Title%02d.full.mp4' % title.number)
+        self.RipTitle(Task(title, None), full_output, dry_run, verbose,
+                      no_subtitles, log_path=log_path, markers=True,
+                      on_progress=on_progress)
+        if dry_run:
+            for task, output in zip(tasks, outputs):
+                print('Cut chapter %d to %r' % (task.chapter, output))
+            return
+
+        try:
+            boundaries = ProbeChapterTimes(full_output)
+            if len(boundaries) != len(title.chapters):
+                # Fall back to the scanned chapter durations.
+                boundaries = []
+                position = 0
+                for chapter in title.chapters:
+                    seconds = chapter.duration.in_seconds()
+                    boundaries.append((position, position + seconds))
+                    position += seconds
+            for task, output in zip(tasks, outputs):
+                start, end = boundaries[task.chapter - 1]
+                CutSegment(full_output, start, end - start, output,
+                           verbose=verbose, log_path=log_path)
+        finally:
+            os.remove(full_output)
+
+    def RipJoinedSource(self, title, vts, cells, output, dry_run, verbose,
+                        no_subtitles=False, on_progress=None):
+        """
+        Encodes cells (see SourceJoinCells) into output with one encode.
+
+        The cells are first copied into a single stream next to output,
+        which is removed afterwards. title supplies the encode settings.
+        """
+        if dry_run:
+            print('Concatenate %d cells of title set %d' % (len(cells), vts))
+            self.RipTitle(Task(title, None), output, dry_run, verbose,
+                          no_subtitles, input_path='<joined stream>')
+            return
+        fd, stream_path = tempfile.mkstemp(
+                prefix='.dvdrip_join_', suffix='.vob',
+                dir=os.path.dirname(output) or '.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                CopyTitleSectors(FindVideoTs(self.mountpoint), vts, cells, f)
+            self.RipTitle(Task(title, None), output, dry_run, verbose,
+                          no_subtitles, input_path=stream_path,
+                          on_progress=on_progress)
+        finally:
+            os.remove(stream_path)
 
     def ScanTitle(self, i):
+        """
+        Scans title i, or every title on the disc if i is 0.
+        """
         for line in check_err([
             HANDBRAKE,
             #'--no-dvdnav', # TODO: turn this on as a fallback
@@ -485,70 +1099,303 @@ class DVD:
                         print('< %s' % line.rstrip())
                 yield line
 
-    def ScanTitles(self, title_numbers, verbose):
+    def ScanTitles(self, title_numbers, verbose, single_pass=True,
+                   scanner='auto', jobs=1):
         """
         Returns an iterable of parsed titles.
+
+        scanner selects how titles are scanned: 'ifo' reads the IFO files
+        directly, 'handbrake' runs HandBrakeCLI, and 'auto' tries the IFO
+        files first and falls back to HandBrakeCLI.
+
+        If single_pass is set, the whole disc is scanned by a single
+        HandBrakeCLI process, preferably using its JSON output, and only
+        titles that fail to parse are rescanned individually. Otherwise
+        titles are scanned one HandBrakeCLI process each, up to jobs at a
+        time.
         """
-        first = title_numbers[0] if title_numbers else 1
-        raw_scan = tuple(self.ScanTitle(first))
-        title_count = FindTitleCount(raw_scan, verbose)
-        print('Disc claims to have %d titles.' % title_count)
-        title_name, title_info = only(
-                ParseTitleScan(ExtractTitleScan(raw_scan)).items())
-        del raw_scan
+        if scanner != 'handbrake':
+            try:
+                titles = tuple(self.ScanIfoTitles(title_numbers))
+            except (ValueError, IndexError, struct.error) as exc:
+                if scanner == 'ifo':
+                    raise UserError('Cannot read IFO files: %s' % exc)
+                if verbose:
+                    print('Cannot read IFO files (%s), using %s.'
+                            % (exc, HANDBRAKE))
+            else:
+                yield from titles
+                return
 
-        def MakeTitle(name, number, info):
-            assert ('title %d' % number) == name
-            info['duration'] = ExtractDuration('duration ' + info['duration'])
-            return Title(number, info)
+        if single_pass and (not title_numbers or len(title_numbers) > 1):
+            try:
+                title_set, raw_log = self.ScanTitleJson(0)
+            except subprocess.CalledProcessError:
+                title_set = None
+            if title_set is not None:
+                yield from self.ScanJsonTitles(title_set, raw_log,
+                                               title_numbers, verbose)
+                return
+
+            try:
+                raw_scan = tuple(self.ScanTitle(0))
+            except subprocess.CalledProcessError:
+                warn("Cannot scan whole disc, scanning titles separately.")
+            else:
+                yield from self.ScanAllTitles(raw_scan, title_numbers,
+                                              verbose)
+                return
 
-        yield MakeTitle(title_name, first, title_info)
+        first = title_numbers[0] if title_numbers else 1
+        title, raw_log = self.ScanSingleTitle(first)
+        title_count = FindTitleCount(raw_log, verbose)
+        self.FoundTitleCount(title_count)
+        del raw_log
+
+        if title is None:
+            warn("Cannot parse scan of title %d." % first)
+        else:
+            yield title
 
         to_scan = [x for x in range(1, title_count + 1)
                    if x != first
                         and ((not title_numbers)
                              or x in title_numbers)]
-        for i in to_scan:
+        yield from self.ScanTitlesSeparately(to_scan, jobs)
+
+    def FoundTitleCount(self, title_count):
+        self.title_count = title_count
+        print('Disc claims to have %d titles.' % title_count)
+
+    def ScanTitleJson(self, i):
+        """
+        Scans title i, or every title on the disc if i is 0, asking
+        HandBrakeCLI for JSON output.
+
+        Returns the decoded "JSON Title Set" (or None if HandBrakeCLI did not
+        produce one) and the lines of the scan log.
+        """
+        p = subprocess.run([
+            HANDBRAKE,
+            '--json',
+            '--scan',
+            '--min-duration', '0',
+            '--title', str(i),
+            '-i',
+            self.mountpoint], capture_output=True, check=True)
+        log = p.stderr.decode(CHAR_ENCODING, 'replace').split(os.linesep)
+        if self.verbose:
+            for line in log:
+                print('< %s' % line.rstrip())
+        return (ExtractJsonTitleSet(p.stdout.decode(CHAR_ENCODING, 'replace')),
+                log)
+
+    def ScanJsonTitles(self, title_set, raw_log, title_numbers, verbose):
+        """
+        Converts the titles of a JSON title set.
+
+        Titles that are missing from it or cannot be converted are rescanned
+        one at a time using the text scan.
+        """
+        title_list = {t.get('Index'): t for t in title_set.get('TitleList', [])}
+        try:
+            title_count = FindTitleCount(raw_log, False)
+        except AssertionError:
+            title_count = max(title_list, default=0)
+        self.FoundTitleCount(title_count)
+
+        for i in range(1, title_count + 1):
+            if title_numbers and i not in title_numbers:
+                continue
+            title = None
+            if i in title_list:
                 try:
-                    scan = ExtractTitleScan(self.ScanTitle(i))
-                except subprocess.CalledProcessError as exc:
-                    warn("Cannot scan title %d." % i)
-                else:
-                    title_info_names = ParseTitleScan(scan).items()
-                    if title_info_names:
-                        title_name, title_info = only(title_info_names)
-                        yield MakeTitle(title_name, i, title_info)
-                    else:
-                        warn("Cannot parse scan of title %d." % i)
+                    title = ParseJsonTitle(i, title_list[i])
+                except (KeyError, TypeError, ValueError, ZeroDivisionError):
+                    pass
+            if title is None:
+                yield from self.ScanTitlesSeparately([i], use_json=False)
+            else:
+                yield title
+
+    def ScanIfoTitles(self, title_numbers):
+        """
+        Returns an iterable of titles read directly from the IFO files.
+        """
+        title_count, titles = IfoTitles(self.mountpoint)
+        self.FoundTitleCount(title_count)
+        for title in titles:
+            if not title_numbers or title.number in title_numbers:
+                yield title
+
+    def ScanAllTitles(self, raw_scan, title_numbers, verbose):
+        """
+        Parses the scan of every title produced by one HandBrakeCLI process.
+
+        Titles missing from the combined scan, or whose block cannot be
+        parsed, are rescanned one at a time.
+        """
+        title_count = FindTitleCount(raw_scan, verbose)
+        self.FoundTitleCount(title_count)
+        blocks = SplitTitleScans(raw_scan)
+        del raw_scan
+
+        for i in range(1, title_count + 1):
+            if title_numbers and i not in title_numbers:
+                continue
+            title = None
+            if i in blocks:
+                try:
+                    title_name, title_info = only(
+                            ParseTitleScan(blocks[i]).items())
+                    title = MakeTitle(title_name, i, title_info)
+                except (AssertionError, AttributeError, KeyError,
+                        ValueError):
+                    pass
+            if title is None:
+                yield from self.ScanTitlesSeparately([i])
+            else:
+                yield title
+
+    def ScanTitlesSeparately(self, to_scan, jobs=1, use_json=True):
+        """
+        Scans each title in to_scan with its own HandBrakeCLI process.
+
+        Up to jobs titles are scanned concurrently. Titles are still yielded
+        in the order of to_scan.
+        """
+        def Scan(i):
+            return self.ScanTitleSeparately(i, use_json)
+        if jobs > 1 and len(to_scan) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                results = list(executor.map(Scan, to_scan))
+        else:
+            results = map(Scan, to_scan)
+        for title, error in results:
+            if error:
+                warn(error)
+            else:
+                yield title
+
+    def ScanTitleSeparately(self, i, use_json=True):
+        """
+        Scans title i with its own HandBrakeCLI process.
+
+        Returns the Title and None, or None and a warning message.
+        """
+        try:
+            title, _ = self.ScanSingleTitle(i, use_json)
+        except subprocess.CalledProcessError:
+            return None, "Cannot scan title %d." % i
+        if title is None:
+            return None, "Cannot parse scan of title %d." % i
+        return title, None
+
+    def ScanSingleTitle(self, i, use_json=True):
+        """
+        Scans title i with its own HandBrakeCLI process, preferably using its
+        JSON output, and falling back to the text scan.
+
+        Returns the Title (or None if the scan cannot be parsed) and the lines
+        of the scan log. Raises subprocess.CalledProcessError if HandBrakeCLI
+        fails.
+        """
+        if use_json:
+            try:
+                title_set, raw_log = self.ScanTitleJson(i)
+            except subprocess.CalledProcessError:
+                title_set = None
+            for info in (title_set or {}).get('TitleList', []):
+                if info.get('Index') == i:
+                    try:
+                        return ParseJsonTitle(i, info), raw_log
+                    except (KeyError, TypeError, ValueError,
+                            ZeroDivisionError):
+                        break
+
+        raw_scan = tuple(self.ScanTitle(i))
+        try:
+            title_info_names = ParseTitleScan(
+                    ExtractTitleScan(raw_scan)).items()
+            if title_info_names:
+                title_name, title_info = only(title_info_names)
+                return MakeTitle(title_name, i, title_info), raw_scan
+        except (AssertionError, AttributeError, KeyError, ValueError):
+            pass
+        return None, raw_scan
 
     def Eject(self):
-        if os.name == 'nt':
-            if len(self.mountpoint) < 4 and self.mountpoint[1] == ':':
-                # mountpoint is only a drive letter like "F:" or "F:\" not a subdirectory
-                drive_letter = self.mountpoint[0]
-                ctypes.windll.WINMM.mciSendStringW("open %s: type CDAudio alias %s_drive" % (drive_letter, drive_letter), None, 0, None)
-                ctypes.windll.WINMM.mciSendStringW("set %s_drive door open" % drive_letter, None, 0, None)
+        EjectDisc(self.disc_path)
+
+def EjectDisc(disc_path):
+    """
+    Ejects the disc at disc_path, a device or the directory it is mounted on.
+    """
+    if os.name == 'nt':
+        if len(disc_path) < 4 and disc_path[1] == ':':
+            import ctypes
+            # disc_path is only a drive letter like "F:" or "F:\" not a subdirectory
+            drive_letter = disc_path[0]
+            ctypes.windll.WINMM.mciSendStringW("open %s: type CDAudio alias %s_drive" % (drive_letter, drive_letter), None, 0, None)
+            ctypes.windll.WINMM.mciSendStringW("set %s_drive door open" % drive_letter, None, 0, None)
+        return
+
+    deadline = time.time() + TOTAL_EJECT_SECONDS
+    if is_block_device(disc_path):
+        devnode = disc_path
+    else:
+        devnode = mountpoint_source(disc_path)
+    if fcntl is not None and devnode and is_block_device(devnode):
+        mountpoint = find_mountpoint(devnode)
+        while mountpoint and release_mount(mountpoint):
+            mountpoint = find_mountpoint(devnode)
+        if eject_device(devnode, deadline):
             return
 
-        # TODO: this should really be a while loop that terminates once a
-        # deadline is met.
-        for i in range(TOTAL_EJECT_SECONDS * EJECT_ATTEMPTS_PER_SECOND):
-            if not subprocess.call(['eject', self.mountpoint]):
+    # Fall back to the eject command, which unmounts the disc itself.
+    delay = EJECT_RETRY_MIN_SECONDS
+    while True:
+        try:
+            if not subprocess.call(['eject', disc_path]):
                 return
-            time.sleep(1.0 / EJECT_ATTEMPTS_PER_SECOND)
-
-def ParseDuration(s):
-    result = 0
-    for field in s.strip().split(':'):
-        result *= 60
-        result += int(field)
-    return result
+        except FileNotFoundError:
+            warn('Cannot eject %r: no eject command.' % disc_path)
+            return
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            warn('Could not eject %r.' % disc_path)
+            return
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, EJECT_RETRY_MAX_SECONDS)
 
 def FindMountPoint(dev, timeout):
+    end_time = time.time() + timeout
+    try:
+        mountinfo = open(MOUNTINFO_PATH, 'r')
+    except OSError:
+        mountinfo = None
+    if mountinfo is not None:
+        with mountinfo:
+            # The kernel flags mountinfo for poll() whenever something is
+            # mounted or unmounted, so there's no need to keep re-reading it.
+            poller = select.poll()
+            poller.register(mountinfo, select.POLLPRI | select.POLLERR)
+            while True:
+                mountinfo.seek(0)
+                mountpoint = mountinfo_mountpoint(
+                        dev, parse_mountinfo(mountinfo.read()))
+                if mountpoint:
+                    return mountpoint
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    break
+                poller.poll(remaining * 1000)
+        raise UserError('%r not mounted.' % dev)
+
+    # No mountinfo (eg: on macOS), so ask df.
     regex = re.compile(r'^' + re.escape(os.path.realpath(dev)) + r'\b')
-
     now = time.time()
-    end_time = now + timeout
     while end_time >= now:
         for line in check_output(['df', '-P']).split('\n'):
             m = regex.match(line)
@@ -565,21 +1412,76 @@ def FindMainFeature(titles, verbose=False):
         print('Attempting to determine main feature of %d titles...'
                 % len(titles))
     main_feature = max(titles,
-            key=lambda title: ParseDuration(title.info['duration']))
+            key=lambda title: title.duration.in_seconds())
     if verbose:
         print('Selected %r as main feature.' % main_feature.number)
         print()
+    return main_feature
 
-def ConstructTasks(titles, chapter_split):
-    for title in titles:
-        num_chapters = len(title.info['chapters'])
-        if chapter_split and num_chapters > 1:
-            for chapter in range(1, num_chapters + 1):
-                yield Task(title, chapter)
-        else:
+def TitleFingerprint(title, cells=None):
+    """
+    Returns a key that is equal for titles that play the same content.
+
+    If cells (the title's IfoCells) are given, titles match when they play
+    the same sectors of the same title set, in any order. Otherwise they
+    match when they have the same chapter durations, in any order, and the
+    same picture and track layout.
+    """
+    if cells is not None:
+        vts, cells = cells
+        return ('cells', vts, tuple(sorted(
+                (cell.first_sector, cell.last_sector) for cell in cells)))
+    return ('layout',
+            tuple(sorted(c.duration.in_seconds() for c in title.chapters)),
+            title.size,
+            tuple((a.lang, a.codec, a.channels) for a in title.audio_tracks),
+            len(title.subtitle_tracks))
+
+def FilterTitles(titles, mountpoint, dedupe=False, min_seconds=0):
+    """
+    Returns titles without those shorter than min_seconds and, if dedupe
+    is set, without titles that duplicate an earlier title.
+
+    Duplicates are found by comparing the cells titles play, if the IFO
+    files can be read, or otherwise their chapter and track layout.
+    """
+    title_cells = {}
+    if dedupe:
+        try:
+            title_cells = IfoTitleCells(mountpoint)
+        except (ValueError, IndexError, struct.error, OSError) as exc:
+            warn("Cannot read IFO files, comparing titles by their "
+                 "layout instead: %s" % exc)
+    kept = []
+    seen = {}
+    for title in titles:
+        seconds = title.duration.in_seconds()
+        if seconds < min_seconds:
+            print('Skipping title %d: only %s long.'
+                  % (title.number, title.duration))
+            continue
+        if dedupe:
+            fingerprint = TitleFingerprint(title,
+                                           title_cells.get(title.number))
+            if fingerprint in seen:
+                print('Skipping title %d: duplicate of title %d.'
+                      % (title.number, seen[fingerprint]))
+                continue
+            seen[fingerprint] = title.number
+        kept.append(title)
+    return kept
+
+def ConstructTasks(titles, chapter_split):
+    for title in titles:
+        num_chapters = len(title.chapters)
+        if chapter_split and num_chapters > 1:
+            for chapter in range(1, num_chapters + 1):
+                yield Task(title, chapter)
+        else:
             yield Task(title, None)
 
-def TaskFilenames(tasks, output, dry_run=False, metadata=None):
+def TaskFilenames(tasks, output, dry_run=False, metadata=None,
+                  multiple=None):
     """
     Generate filenames for ripping tasks.
 
@@ -588,6 +1490,8 @@ def TaskFilenames(tasks, output, dry_run=False, metadata=None):
         output: Base output path/name
         dry_run: Whether this is a dry run
         metadata: Optional dict with 'title' and 'year' for naming
+        multiple: Whether the rip produces several files, if tasks are only
+            part of it (default: whether there are several tasks)
 
     Returns:
         List of output filenames
@@ -601,7 +1505,10 @@ def TaskFilenames(tasks, output, dry_run=False, metadata=None):
         # Fall back to the output parameter
         base_name = os.path.basename(output) if output else "Video"
 
-    if (len(tasks) > 1):
+    if multiple is None:
+        multiple = len(tasks) > 1
+
+    if multiple:
         # Multiple titles: create directory with individual files
         output_dir = output if not metadata else os.path.join(os.path.dirname(output) if output else '.', base_name)
 
@@ -640,24 +1547,166 @@ def TaskFilenames(tasks, output, dry_run=False, metadata=None):
         raise UserError("multiple tasks use same filename")
     return result
 
-def PerformTasks(dvd, tasks, title_count, filenames,
-        dry_run=False, verbose=False, no_subtitles=False):
-    for task, filename in zip(tasks, filenames):
-        print('=' * 78)
-        if task.chapter is None:
-            print('Title %s / %s => %r'
-                    % (task.title.number, title_count, filename))
+def TaskSeconds(task):
+    if task.chapter is None:
+        return task.title.duration.in_seconds()
+    return task.title.chapters[task.chapter - 1].duration.in_seconds()
+
+def DescribeTask(task, title_count, filename):
+    if task.chapter is None:
+        return ('Title %s / %s => %r'
+                % (task.title.number, title_count, filename))
+    num_chapters = len(task.title.chapters)
+    return ('Title %s / %s , Chapter %s / %s=> %r'
+            % (task.title.number, title_count, task.chapter,
+                num_chapters, filename))
+
+def GroupTasks(tasks, split_mode='encode'):
+    """
+    Returns lists of indices of tasks that are produced by the same encode.
+
+    With split_mode 'cut', all chapter tasks of a title share one encode;
+    otherwise every task is encoded on its own.
+    """
+    groups = []
+    chapter_groups = {}
+    for i, task in enumerate(tasks):
+        if split_mode != 'cut' or task.chapter is None:
+            groups.append([i])
+        elif task.title.number in chapter_groups:
+            chapter_groups[task.title.number].append(i)
+        else:
+            chapter_groups[task.title.number] = [i]
+            groups.append(chapter_groups[task.title.number])
+    return groups
+
+def TaskLabel(task):
+    if task.chapter is None:
+        return 'T%02d' % task.title.number
+    return 'T%02d/C%02d' % (task.title.number, task.chapter)
+
+def PerformTaskGroup(dvd, tasks, filenames, group, dry_run, verbose,
+                     no_subtitles, log_path=None, on_progress=None,
+                     display=None):
+    """
+    Encodes the tasks of one group from GroupTasks.
+
+    Progress is shown on display and passed to on_progress along with the
+    group's first task. Raises subprocess.CalledProcessError if the encode
+    fails.
+    """
+    task = tasks[group[0]]
+    label = TaskLabel(task) if len(group) == 1 else TaskLabel(task)[:3]
+
+    def Progress(progress):
+        if display:
+            display.Update(label, progress)
+        if on_progress:
+            on_progress(task, progress)
+
+    try:
+        if len(group) == 1:
+            dvd.RipTitle(task, filenames[group[0]], dry_run, verbose,
+                         no_subtitles, log_path=log_path,
+                         on_progress=Progress)
         else:
-            num_chapters = len(task.title.info['chapters'])
-            print('Title %s / %s , Chapter %s / %s=> %r'
-                    % (task.title.number, title_count, task.chapter,
-                        num_chapters, filename))
+            dvd.RipChapters([tasks[i] for i in group],
+                            [filenames[i] for i in group], dry_run, verbose,
+                            no_subtitles, log_path=log_path,
+                            on_progress=Progress)
+    finally:
+        if display:
+            display.Finish(label)
+
+def PerformTasks(dvd, tasks, title_count, filenames,
+        dry_run=False, verbose=False, no_subtitles=False, jobs=1,
+        split_mode='encode', on_progress=None, on_complete=None):
+    """
+    Encodes each task into the corresponding filename.
+
+    Encoding progress is shown on a status line, and passed to on_progress
+    (if given) as the task and a Progress. on_complete (if given) is called
+    with the index of each task as soon as it has been encoded.
+
+    With split_mode 'cut', the chapters of each title are cut out of a
+    single encode of the title instead of being encoded one by one.
+
+    With jobs > 1, up to that many encodes run at once, longest first, each
+    logging to its own file next to its output. Returns a list with
+    whether each task succeeded.
+    """
+    groups = GroupTasks(tasks, split_mode)
+    display = None if verbose else ProgressDisplay()
+    if jobs > 1 and len(groups) > 1:
+        return PerformTasksConcurrently(dvd, tasks, title_count, filenames,
+                groups, dry_run, verbose, no_subtitles, jobs, on_progress,
+                on_complete, display)
+
+    results = [False] * len(tasks)
+    for group in groups:
+        for i in group:
+            print('=' * 78)
+            print(DescribeTask(tasks[i], title_count, filenames[i]))
         print('-' * 78)
         try:
-            dvd.RipTitle(task, filename, dry_run, verbose, no_subtitles)
+            PerformTaskGroup(dvd, tasks, filenames, group, dry_run, verbose,
+                             no_subtitles, on_progress=on_progress,
+                             display=display)
         except subprocess.CalledProcessError as exc:
             warn("Failed to encode title %d (exit status %d), skipping."
-                 % (task.title.number, exc.returncode))
+                 % (tasks[group[0]].title.number, exc.returncode))
+        else:
+            for i in group:
+                results[i] = True
+                if on_complete and not dry_run:
+                    on_complete(i)
+    return results
+
+def PerformTasksConcurrently(dvd, tasks, title_count, filenames, groups,
+        dry_run, verbose, no_subtitles, jobs, on_progress, on_complete,
+        display):
+    def Perform(group):
+        for i in group:
+            print('[dvdrip] Started: %s' % DescribeTask(tasks[i], title_count,
+                                                        filenames[i]))
+        log_path = None if dry_run else filenames[group[0]] + '.log'
+        try:
+            PerformTaskGroup(dvd, tasks, filenames, group, dry_run, verbose,
+                             no_subtitles, log_path=log_path,
+                             on_progress=on_progress, display=display)
+        except subprocess.CalledProcessError as exc:
+            return exc.returncode, log_path
+        if log_path:
+            os.remove(log_path)
+        if on_complete and not dry_run:
+            for i in group:
+                on_complete(i)
+        return None, None
+
+    # Starting the longest encodes first keeps one long straggler from
+    # running alone at the end of the batch.
+    def GroupSeconds(group):
+        return sum(TaskSeconds(tasks[i]) for i in group)
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+        for group in sorted(groups, key=GroupSeconds, reverse=True):
+            future = executor.submit(Perform, group)
+            for i in group:
+                futures[i] = future
+
+    results = []
+    for i, (task, filename) in enumerate(zip(tasks, filenames)):
+        print('=' * 78)
+        print(DescribeTask(task, title_count, filename))
+        returncode, log_path = futures[i].result()
+        if returncode is None:
+            results.append(True)
+        else:
+            warn("Failed to encode title %d (exit status %d), see %r."
+                 % (task.title.number, returncode, log_path))
+            results.append(False)
+    return results
 
 Size = namedtuple('Size',
         ['width', 'height', 'pix_aspect_width', 'pix_aspect_height', 'fps'])
@@ -690,6 +1739,12 @@ class Duration(namedtuple('Duration', 'hours minutes seconds')):
     def in_seconds(self):
         return 60 * (60 * self.hours + self.minutes) + self.seconds
 
+    @classmethod
+    def from_seconds(cls, seconds):
+        minutes, seconds = divmod(int(round(seconds)), 60)
+        hours, minutes = divmod(minutes, 60)
+        return cls(hours, minutes, seconds)
+
 def ExtractDuration(s):
     return Duration(*map(int, DURATION_REGEX.match(s).groups()))
 
@@ -731,58 +1786,1153 @@ def ParseAudioTracks(d):
         else:
             warn('Cannot parse audio track info %r' % info)
 
-SubtitleTrack = namedtuple('SubtitleTrack',
-        'number info')
+SubtitleTrack = namedtuple('SubtitleTrack',
+        'number info')
+
+def ParseSubtitleTracks(d):
+    for number, info in sorted(((int(n), info) for (n, info) in d.items())):
+        yield SubtitleTrack(number, info)
+
+# Native DVD-Video IFO reader.
+#
+# This reads just enough of VIDEO_TS.IFO (the title search pointer table) and
+# of each VTS_xx_0.IFO (stream attributes, part-of-title table and program
+# chains) to produce the same title info that a HandBrakeCLI scan yields,
+# without spinning up HandBrake or libdvdnav.
+
+DVD_SECTOR_SIZE = 2048
+
+# ISO 639-1 codes stored in IFO files, mapped to the language names and
+# ISO 639-2 codes HandBrakeCLI reports.
+IFO_LANGUAGES = {
+    'ar': ('Arabic', 'ara'),
+    'cs': ('Czech', 'cze'),
+    'da': ('Danish', 'dan'),
+    'de': ('German', 'ger'),
+    'el': ('Greek', 'gre'),
+    'en': ('English', 'eng'),
+    'es': ('Spanish', 'spa'),
+    'fi': ('Finnish', 'fin'),
+    'fr': ('French', 'fre'),
+    'he': ('Hebrew', 'heb'),
+    'hi': ('Hindi', 'hin'),
+    'hu': ('Hungarian', 'hun'),
+    'is': ('Icelandic', 'ice'),
+    'it': ('Italian', 'ita'),
+    'ja': ('Japanese', 'jpn'),
+    'ko': ('Korean', 'kor'),
+    'nl': ('Dutch', 'dut'),
+    'no': ('Norwegian', 'nor'),
+    'pl': ('Polish', 'pol'),
+    'pt': ('Portuguese', 'por'),
+    'ru': ('Russian', 'rus'),
+    'sv': ('Swedish', 'swe'),
+    'th': ('Thai', 'tha'),
+    'tr': ('Turkish', 'tur'),
+    'zh': ('Chinese', 'chi'),
+}
+
+IFO_UNKNOWN_LANGUAGE = ('Unknown', 'und')
+
+# Line21 closed caption flags (field 1 and field 2) in the second byte of
+# the video attributes.
+IFO_LINE21_CC = 0xC0
+
+IFO_AUDIO_CODECS = {0: 'AC3', 2: 'MPEG1', 3: 'MPEG2', 4: 'LPCM', 6: 'DTS'}
+
+IfoTitle = namedtuple('IfoTitle', 'number parts vts vts_ttn')
+IfoCell = namedtuple('IfoCell',
+        'seconds first_sector last_sector alternate_angle')
+IfoPgc = namedtuple('IfoPgc', 'programs cells audio_control subp_control')
+IfoVts = namedtuple('IfoVts', 'video audio subpictures parts pgcs')
+
+def FindVideoTs(mountpoint):
+    """
+    Returns the VIDEO_TS directory of mountpoint, or None if there is none.
+    """
+    if os.path.basename(os.path.normpath(mountpoint)).upper() == 'VIDEO_TS':
+        return mountpoint
+    try:
+        names = os.listdir(mountpoint)
+    except OSError:
+        return None
+    for name in names:
+        path = os.path.join(mountpoint, name)
+        if name.upper() == 'VIDEO_TS' and os.path.isdir(path):
+            return path
+    return None
+
+def FindVideoTsFile(video_ts, name):
+    """
+    Returns the path of file name (eg: 'VTS_01_1.VOB') in video_ts, which
+    may be in lower case, or None if there is no such file.
+    """
+    for candidate in (name, name.lower()):
+        path = os.path.join(video_ts, candidate)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def ReadIfo(video_ts, name):
+    """
+    Reads IFO file name (eg: 'VTS_01_0.IFO') from video_ts.
+
+    Falls back to the .BUP backup copy if the IFO itself can't be read.
+    """
+    base, _ = os.path.splitext(name)
+    for candidate in (name, base + '.BUP'):
+        path = FindVideoTsFile(video_ts, candidate)
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except (OSError, TypeError):
+            pass
+    raise ValueError('Cannot read %s in %r' % (name, video_ts))
+
+def BcdToInt(b):
+    return 10 * (b >> 4) + (b & 0x0f)
+
+def ParseDvdTime(data, offset):
+    """
+    Parses a BCD encoded playback time (hh, mm, ss, frames) into seconds.
+    """
+    hours, minutes, seconds, frames = data[offset:offset + 4]
+    result = 60 * (60 * BcdToInt(hours) + BcdToInt(minutes)) + BcdToInt(seconds)
+    fps = {1: 25, 3: 30000 / 1001}.get(frames >> 6)
+    if fps:
+        result += BcdToInt(frames & 0x3f) / fps
+    return result
+
+def ParseVmgTitles(vmg):
+    """
+    Parses the title search pointer table of VIDEO_TS.IFO.
+    """
+    if vmg[:12] != b'DVDVIDEO-VMG':
+        raise ValueError('Not a video manager IFO')
+    table, = struct.unpack_from('>I', vmg, 0xC4)
+    table *= DVD_SECTOR_SIZE
+    count, = struct.unpack_from('>H', vmg, table)
+    titles = []
+    for i in range(count):
+        _, _, parts, _, vts, vts_ttn, _ = struct.unpack_from(
+                '>BBHHBBI', vmg, table + 8 + 12 * i)
+        titles.append(IfoTitle(i + 1, parts, vts, vts_ttn))
+    return titles
+
+def ParsePgc(vts, base):
+    num_programs, num_cells = vts[base + 2], vts[base + 3]
+    audio_control = struct.unpack_from('>8H', vts, base + 0x0C)
+    subp_control = struct.unpack_from('>32I', vts, base + 0x1C)
+    program_map, cell_playback = struct.unpack_from('>HH', vts, base + 0xE6)
+    programs = tuple(vts[base + program_map:
+                         base + program_map + num_programs])
+    cells = []
+    for i in range(num_cells):
+        offset = base + cell_playback + 24 * i
+        block_mode = (vts[offset] >> 6) & 3
+        block_type = (vts[offset] >> 4) & 3
+        first_sector, = struct.unpack_from('>I', vts, offset + 8)
+        last_sector, = struct.unpack_from('>I', vts, offset + 20)
+        cells.append(IfoCell(
+            ParseDvdTime(vts, offset + 4), first_sector, last_sector,
+            # Only the first cell of an angle block counts towards the
+            # playback time.
+            block_type == 1 and block_mode > 1))
+    return IfoPgc(programs, tuple(cells), audio_control, subp_control)
+
+def ParseVts(vts):
+    """
+    Parses the attributes, part-of-title table and program chains of a
+    VTS_xx_0.IFO.
+    """
+    if vts[:12] != b'DVDVIDEO-VTS':
+        raise ValueError('Not a video title set IFO')
+    ptt_table, pgc_table = (
+        DVD_SECTOR_SIZE * x for x in struct.unpack_from('>II', vts, 0xC8))
+
+    num_audio, = struct.unpack_from('>H', vts, 0x202)
+    audio = [vts[0x204 + 8 * i:0x20C + 8 * i] for i in range(min(num_audio, 8))]
+    num_subp, = struct.unpack_from('>H', vts, 0x254)
+    subpictures = [vts[0x256 + 6 * i:0x25C + 6 * i]
+                   for i in range(min(num_subp, 32))]
+
+    num_ttns, = struct.unpack_from('>H', vts, ptt_table)
+    last_byte, = struct.unpack_from('>I', vts, ptt_table + 4)
+    offsets = struct.unpack_from('>%dI' % num_ttns, vts, ptt_table + 8)
+    ends = offsets[1:] + (last_byte + 1,)
+    parts = [[struct.unpack_from('>HH', vts, ptt_table + x)
+              for x in range(start, end, 4)]
+             for start, end in zip(offsets, ends)]
+
+    num_pgcs, = struct.unpack_from('>H', vts, pgc_table)
+    pgcs = []
+    for i in range(num_pgcs):
+        start, = struct.unpack_from('>I', vts, pgc_table + 12 + 8 * i)
+        pgcs.append(ParsePgc(vts, pgc_table + start))
+
+    return IfoVts(vts[0x200:0x202], audio, subpictures, parts, pgcs)
+
+def IfoChapterCells(vts, vts_ttn, num_parts):
+    """
+    Returns a list with the cells of each chapter of a title.
+    """
+    result = []
+    for pgcn, pgn in vts.parts[vts_ttn - 1][:num_parts]:
+        pgc = vts.pgcs[pgcn - 1]
+        first = pgc.programs[pgn - 1] - 1
+        if pgn < len(pgc.programs):
+            end = pgc.programs[pgn] - 1
+        else:
+            end = len(pgc.cells)
+        result.append([cell for cell in pgc.cells[first:end]
+                       if not cell.alternate_angle])
+    return result
+
+def IfoLanguage(code):
+    try:
+        code = code.decode('ascii').lower()
+    except UnicodeDecodeError:
+        return IFO_UNKNOWN_LANGUAGE
+    return IFO_LANGUAGES.get(code, IFO_UNKNOWN_LANGUAGE)
+
+def IfoSize(video):
+    pal = (video[0] >> 4) & 3 == 1
+    wide = (video[0] >> 2) & 3 == 3
+    picture_size = (video[1] >> 2) & 3
+    width = (720, 704, 352, 352)[picture_size]
+    height = 576 if pal else 480
+    if picture_size == 3:
+        height //= 2
+    aspect_width, aspect_height = (16, 9) if wide else (4, 3)
+    par_width, par_height = aspect_width * height, aspect_height * width
+    d = gcd(par_width, par_height)
+    return Size(width, height, par_width // d, par_height // d,
+                25.0 if pal else 30000 / 1001)
+
+def IfoAudioTracks(vts, pgc):
+    result = []
+    for stream, attributes in enumerate(vts.audio):
+        if not pgc.audio_control[stream] & 0x8000:
+            continue
+        codec = IFO_AUDIO_CODECS.get(attributes[0] >> 5, 'Unknown')
+        channels = (attributes[1] & 7) + 1
+        rate = 96000 if (attributes[1] >> 4) & 3 == 1 else 48000
+        if (attributes[0] >> 2) & 3 == 1:
+            name, iso639_2 = IfoLanguage(attributes[2:4])
+        else:
+            name, iso639_2 = IFO_UNKNOWN_LANGUAGE
+        result.append(AudioTrack(len(result) + 1, name, codec,
+                '5.1' if channels == 6 else '%d.0' % channels, iso639_2,
+                '%dHz' % rate))
+    return tuple(result)
+
+def IfoSubtitleTracks(vts, pgc):
+    result = []
+    for stream, attributes in enumerate(vts.subpictures):
+        if not pgc.subp_control[stream] & 0x80000000:
+            continue
+        if attributes[0] & 3 == 1:
+            name, iso639_2 = IfoLanguage(attributes[2:4])
+        else:
+            name, iso639_2 = IFO_UNKNOWN_LANGUAGE
+        result.append(SubtitleTrack(len(result) + 1,
+                '%s (iso639-2: %s) (Bitmap)(VOBSUB)' % (name, iso639_2)))
+    # The line21 bits of the video attributes mark closed captions in the
+    # video stream, which HandBrakeCLI lists after the subpictures.
+    if vts.video[1] & IFO_LINE21_CC:
+        result.append(SubtitleTrack(len(result) + 1,
+                'English, Closed Caption (iso639-2: eng) (Text)(CC608)'))
+    return tuple(result)
+
+def IfoReadTitles(mountpoint):
+    """
+    Reads the IFO files under mountpoint.
+
+    Returns the title count claimed by the disc and a generator of
+    (IfoTitle, IfoVts, chapter cells) triples for the titles that have any
+    cells.
+    """
+    video_ts = FindVideoTs(mountpoint)
+    if video_ts is None:
+        raise ValueError('No VIDEO_TS directory in %r' % mountpoint)
+    titles = ParseVmgTitles(ReadIfo(video_ts, 'VIDEO_TS.IFO'))
+
+    def Generate():
+        title_sets = {}
+        for title in titles:
+            if title.vts not in title_sets:
+                title_sets[title.vts] = ParseVts(
+                        ReadIfo(video_ts, 'VTS_%02d_0.IFO' % title.vts))
+            vts = title_sets[title.vts]
+            chapters = IfoChapterCells(vts, title.vts_ttn, title.parts)
+            if any(chapters):
+                yield title, vts, chapters
+
+    return len(titles), Generate()
+
+def IfoTitleCells(mountpoint):
+    """
+    Returns a dict mapping title numbers to the number of their video title
+    set and a list of their cells in playback order.
+    """
+    _, titles = IfoReadTitles(mountpoint)
+    return {title.number: (title.vts, [cell for cells in chapters
+                                       for cell in cells])
+            for title, _, chapters in titles}
+
+def IfoTitles(mountpoint):
+    """
+    Reads the IFO files under mountpoint.
+
+    Returns the title count claimed by the disc and a generator of Titles.
+    """
+    title_count, ifo_titles = IfoReadTitles(mountpoint)
+
+    def Generate():
+        for title, vts, chapters in ifo_titles:
+            # Stream availability is taken from the first program chain of
+            # the title.
+            pgc = vts.pgcs[vts.parts[title.vts_ttn - 1][0][0] - 1]
+            chapter_seconds = [sum(cell.seconds for cell in cells)
+                               for cells in chapters]
+            yield Title(
+                number=title.number,
+                duration=Duration.from_seconds(sum(chapter_seconds)),
+                size=IfoSize(vts.video),
+                chapters=tuple(
+                    Chapter(i, Duration.from_seconds(seconds))
+                    for i, seconds in enumerate(chapter_seconds, 1)),
+                audio_tracks=IfoAudioTracks(vts, pgc),
+                subtitle_tracks=IfoSubtitleTracks(vts, pgc))
+
+    return title_count, Generate()
+
+# libdvdcss reads the PES scrambling control bits of the first packet of a
+# pack at this offset of its sector.
+CSS_SCRAMBLING_OFFSET = 0x14
+CSS_SAMPLE_SECTORS = 32
+
+def IsScrambledSector(sector):
+    return (len(sector) > CSS_SCRAMBLING_OFFSET
+            and sector.startswith(b'\x00\x00\x01\xba')
+            and bool(sector[CSS_SCRAMBLING_OFFSET] & 0x30))
+
+def VobScrambled(path, first_sector=0, last_sector=None):
+    """
+    Returns whether a sample of the sectors of the VOB at path, from
+    first_sector to last_sector, holds any CSS-scrambled pack.
+
+    Sectors that can't be read count as scrambled, since drives refuse to
+    read encrypted sectors until a CSS key has been exchanged.
+    """
+    try:
+        if last_sector is None:
+            last_sector = os.path.getsize(path) // DVD_SECTOR_SIZE - 1
+        count = min(CSS_SAMPLE_SECTORS, last_sector - first_sector + 1)
+        with open(path, 'rb') as f:
+            for k in range(count):
+                f.seek((first_sector + k * (last_sector - first_sector)
+                        // max(count - 1, 1)) * DVD_SECTOR_SIZE)
+                if IsScrambledSector(f.read(DVD_SECTOR_SIZE)):
+                    return True
+    except OSError:
+        return True
+    return False
+
+def TitleSetVobs(video_ts, vts):
+    """
+    Returns (first sector, end sector, path) for each title VOB of video
+    title set vts; together they form one contiguous sector address space.
+    """
+    vobs = []
+    start = 0
+    for n in range(1, 10):
+        path = FindVideoTsFile(video_ts, 'VTS_%02d_%d.VOB' % (vts, n))
+        if path is None:
+            break
+        sectors = os.path.getsize(path) // DVD_SECTOR_SIZE
+        vobs.append((start, start + sectors, path))
+        start += sectors
+    return vobs
+
+def CellsScrambled(video_ts, vts, cells):
+    """
+    Returns whether a sample of the sectors of cells, which belong to video
+    title set vts, holds any CSS-scrambled pack.
+    """
+    vobs = TitleSetVobs(video_ts, vts)
+    for cell in cells:
+        for vob_start, vob_end, path in vobs:
+            first = max(cell.first_sector, vob_start)
+            last = min(cell.last_sector, vob_end - 1)
+            if first <= last and VobScrambled(path, first - vob_start,
+                                              last - vob_start):
+                return True
+    return False
+
+def CopyTitleSectors(video_ts, vts, cells, out):
+    """
+    Writes the sectors of cells, which belong to video title set vts, to
+    the file object out, producing a single MPEG program stream.
+    """
+    vobs = TitleSetVobs(video_ts, vts)
+    max_sectors = STAGE_CHUNK_BYTES // DVD_SECTOR_SIZE
+    for cell in cells:
+        sector = cell.first_sector
+        while sector <= cell.last_sector:
+            for vob_start, vob_end, path in vobs:
+                if vob_start <= sector < vob_end:
+                    break
+            else:
+                raise ValueError('Sector %d is past the end of title set %d'
+                                 % (sector, vts))
+            count = min(cell.last_sector + 1, vob_end) - sector
+            with open(path, 'rb') as f:
+                f.seek((sector - vob_start) * DVD_SECTOR_SIZE)
+                while count > 0:
+                    chunk = f.read(min(count, max_sectors) * DVD_SECTOR_SIZE)
+                    if not chunk:
+                        raise ValueError('Short read from %r' % path)
+                    out.write(chunk)
+                    count -= len(chunk) // DVD_SECTOR_SIZE
+                    sector += len(chunk) // DVD_SECTOR_SIZE
+
+def SourceJoinCells(mountpoint, title_numbers):
+    """
+    Returns the title set and the cells of the given titles, in order, so
+    that they can be encoded as one concatenated source stream.
+
+    Returns None, after warning why, if that isn't possible.
+    """
+    try:
+        title_cells = IfoTitleCells(mountpoint)
+    except (ValueError, IndexError, struct.error, OSError) as exc:
+        warn("Cannot read IFO files to join at the source: %s" % exc)
+        return None
+    missing = [n for n in title_numbers if n not in title_cells]
+    if missing:
+        warn("Titles %s not found in IFO files." % missing)
+        return None
+    title_sets = {title_cells[n][0] for n in title_numbers}
+    if len(title_sets) != 1:
+        # Each title set has its own stream layout, so their streams can't
+        # simply be concatenated.
+        warn("Titles to join span several title sets.")
+        return None
+    vts = title_sets.pop()
+    cells = [cell for n in title_numbers for cell in title_cells[n][1]]
+    # The sectors are copied without decryption, which HandBrakeCLI only
+    # does when it reads the disc itself.
+    if CellsScrambled(FindVideoTs(mountpoint), vts, cells):
+        warn("Titles to join are CSS-encrypted.")
+        return None
+    return vts, cells
+
+def RenderBar(start, length, total, width):
+    end = start + length
+    start = int(round(start * (width - 1) / total))
+    length = int(round(end * (width - 1) / total)) - start + 1
+    return ('‥' * start +
+            '■' * length +
+            '‥' * (width - start - length))
+
+MAX_BAR_WIDTH = 50
+
+# Persistent scan cache
+
+CACHE_DIR = os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+        'dvdrip')
+
+SCAN_CACHE_MAX_BYTES = 4 * 1024 * 1024
+
+# Bump this whenever the cached form of a Title changes.
+SCAN_CACHE_VERSION = 4
+
+class DiskCache:
+    """
+    A directory of JSON files, one per key, evicted least recently used
+    first once their total size exceeds max_bytes.
+    """
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def Path(self, key):
+        name = hashlib.sha1(key.encode(CHAR_ENCODING)).hexdigest()
+        return os.path.join(self.directory, name + '.json')
+
+    def Get(self, key):
+        path = self.Path(key)
+        try:
+            with open(path, 'r', encoding=CHAR_ENCODING) as f:
+                value = json.load(f)
+            # The modification time doubles as the last access time.
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return value
+
+    def Put(self, key, value):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory,
+                                             suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding=CHAR_ENCODING) as f:
+                json.dump(value, f)
+            os.replace(temp_path, self.Path(key))
+        except OSError as exc:
+            warn('Cannot write cache entry to %r: %s' % (self.directory, exc))
+            return
+        self.Evict()
+
+    def Evict(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+def DiscFingerprint(mountpoint):
+    """
+    Returns a cheap fingerprint of the disc at mountpoint, or None if it has
+    no VIDEO_TS directory.
+
+    The fingerprint covers the names and sizes of all files in VIDEO_TS and
+    the contents of the (small) IFO files, which between them identify a
+    pressing without reading any video data.
+    """
+    video_ts = FindVideoTs(mountpoint)
+    if video_ts is None:
+        return None
+    h = hashlib.sha1()
+    for name in sorted(os.listdir(video_ts), key=str.upper):
+        path = os.path.join(video_ts, name)
+        h.update(('%s\0%d\0' % (name.upper(), os.path.getsize(path)))
+                 .encode(CHAR_ENCODING))
+        if name.upper().endswith('.IFO'):
+            with open(path, 'rb') as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+def TitleToJson(title):
+    return {
+        'number': title.number,
+        'duration': str(title.duration),
+        'size': list(title.size),
+        'chapters': [[c.number, str(c.duration)] for c in title.chapters],
+        'audio_tracks': [list(a) for a in title.audio_tracks],
+        'subtitle_tracks': [list(s) for s in title.subtitle_tracks],
+    }
+
+def TitleFromJson(d):
+    def ToDuration(s):
+        return ExtractDuration('duration ' + s)
+    return Title(
+        number=d['number'],
+        duration=ToDuration(d['duration']),
+        size=Size(*d['size']),
+        chapters=tuple(Chapter(n, ToDuration(s)) for n, s in d['chapters']),
+        audio_tracks=tuple(AudioTrack(*a) for a in d['audio_tracks']),
+        subtitle_tracks=tuple(SubtitleTrack(*s) for s in d['subtitle_tracks']))
+
+def CachedScanTitles(dvd, title_numbers, verbose, rescan=False,
+                     single_pass=True, scanner='auto', jobs=1):
+    """
+    Returns a tuple of the parsed titles of dvd, like DVD.ScanTitles.
+
+    Scans are cached on disk keyed by the disc fingerprint, so scanning the
+    same disc again returns immediately unless rescan is set. A cached scan
+    only stands in for the whole disc once every title the disc claims to
+    have has been scanned; titles that failed to scan are scanned again.
+    """
+    try:
+        fingerprint = DiscFingerprint(dvd.mountpoint)
+    except OSError:
+        fingerprint = None
+    if fingerprint is None:
+        return tuple(dvd.ScanTitles(title_numbers, verbose,
+                single_pass=single_pass, scanner=scanner, jobs=jobs))
+
+    cache = DiskCache(os.path.join(CACHE_DIR, 'scan'), SCAN_CACHE_MAX_BYTES)
+    key = '%s:%s:%d' % (fingerprint, scanner, SCAN_CACHE_VERSION)
+    entry = cache.Get(key) or {'complete': False, 'titles': []}
+    cached = {d['number']: d for d in entry['titles']}
+    if not rescan:
+        missing = [n for n in title_numbers or () if n not in cached]
+        if entry['complete'] and missing:
+            warn('Titles %s are not in the cached scan, scanning again.'
+                 % missing)
+            wanted = None
+        elif entry['complete']:
+            wanted = sorted(n for n in cached
+                            if not title_numbers or n in title_numbers)
+        elif title_numbers and not missing:
+            wanted = title_numbers
+        else:
+            wanted = None
+        if wanted is not None:
+            print('Using cached scan of disc %s.' % fingerprint[:12])
+            return tuple(TitleFromJson(cached[n]) for n in wanted)
+
+    titles = tuple(dvd.ScanTitles(title_numbers, verbose,
+            single_pass=single_pass, scanner=scanner, jobs=jobs))
+    if rescan and not title_numbers:
+        cached = {}
+    for title in titles:
+        cached[title.number] = TitleToJson(title)
+    if dvd.title_count is not None:
+        entry['title_count'] = dvd.title_count
+    title_count = entry.get('title_count')
+    entry['complete'] = title_count is not None and all(
+            n in cached for n in range(1, title_count + 1))
+    entry['titles'] = [cached[n] for n in sorted(cached)]
+    cache.Put(key, entry)
+    return titles
+
+# Disc staging
+
+STAGE_CHUNK_BYTES = 8 * 1024 * 1024
+STAGED_MANIFEST = '.dvdrip-staged'
+
+def FileSha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(STAGE_CHUNK_BYTES), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def StageDisc(mountpoint, stage_dir, verbose=False):
+    """
+    Copies the VIDEO_TS directory of the disc at mountpoint into stage_dir.
+
+    Files are copied in large sequential reads and hashed on the way in; the
+    copy is then re-read and checked against those hashes. Returns the
+    directory to read the staged disc from. A verified copy of the same disc
+    that is already in stage_dir is reused.
+
+    CSS-encrypted discs are not staged, since HandBrakeCLI can only decrypt
+    them when reading the disc itself; None is returned after warning.
+    """
+    video_ts = FindVideoTs(mountpoint)
+    if video_ts is None:
+        raise UserError('%r has no VIDEO_TS directory to stage' % mountpoint)
+    target = os.path.join(stage_dir, DiscFingerprint(mountpoint)[:16])
+    manifest_path = os.path.join(target, STAGED_MANIFEST)
+    if os.path.exists(manifest_path):
+        print('Using staged copy %r' % target)
+        return target
+
+    names = sorted(name for name in os.listdir(video_ts)
+                   if os.path.isfile(os.path.join(video_ts, name)))
+    if any(VobScrambled(os.path.join(video_ts, name)) for name in names
+           if name.upper().endswith('.VOB')):
+        warn('%r is CSS-encrypted, which %s can only decrypt on the disc; '
+             'not staging it.' % (mountpoint, HANDBRAKE))
+        return None
+
+    target_video_ts = os.path.join(target, 'VIDEO_TS')
+    os.makedirs(target_video_ts, exist_ok=True)
+    total = sum(os.path.getsize(os.path.join(video_ts, name))
+                for name in names)
+    print('Staging %.0f MiB to %r' % (total / 2**20, target))
+
+    manifest = {}
+    copied = 0
+    start = time.time()
+    for name in names:
+        h = hashlib.sha1()
+        try:
+            with open(os.path.join(video_ts, name), 'rb') as fin, \
+                    open(os.path.join(target_video_ts, name.upper()),
+                         'wb') as fout:
+                for chunk in iter(lambda: fin.read(STAGE_CHUNK_BYTES), b''):
+                    h.update(chunk)
+                    fout.write(chunk)
+                    copied += len(chunk)
+                    elapsed = max(time.time() - start, 1e-6)
+                    print('\r  %.0f/%.0f MiB (%3d%%)  %.1f MiB/s  '
+                          % (copied / 2**20, total / 2**20,
+                             100 * copied // max(total, 1),
+                             copied / 2**20 / elapsed),
+                          end='', flush=True)
+        except OSError as exc:
+            print()
+            raise UserError('Cannot stage %s: %s' % (name, exc))
+        manifest[name.upper()] = h.hexdigest()
+    print()
+
+    if verbose:
+        print('Verifying staged copy...')
+    for name, digest in manifest.items():
+        if FileSha1(os.path.join(target_video_ts, name)) != digest:
+            raise UserError('Staged copy of %s does not match the disc' % name)
+
+    with open(manifest_path, 'w', encoding=CHAR_ENCODING) as f:
+        json.dump(manifest, f, indent=1)
+    return target
+
+def RemoveStagedCopy(target):
+    """
+    Deletes a copy of a disc made by StageDisc.
+    """
+    import shutil
+    try:
+        shutil.rmtree(target)
+    except OSError as exc:
+        warn('Cannot remove staged copy %r: %s' % (target, exc))
+
+# TMDb metadata functions
+def load_tmdb_api_key():
+    """Load TMDb API key from file or environment variable."""
+    # Try environment variable first
+    api_key = os.environ.get('TMDB_API_KEY')
+    if api_key:
+        return api_key
+
+    # Try config file
+    config_file = os.path.expanduser('~/.tmdb_api_key')
+    if os.path.exists(config_file):
+        with open(config_file, 'r') as f:
+            return f.read().strip()
+
+    return None
+
+def sanitize_filename(name):
+    """Remove/replace characters that are invalid in filenames."""
+    # Replace problematic characters with safe ones
+    name = name.replace('/', '-')
+    name = name.replace('\\', '-')
+    name = name.replace(':', '-')
+    name = name.replace('*', '')
+    name = name.replace('?', '')
+    name = name.replace('"', "'")
+    name = name.replace('<', '')
+    name = name.replace('>', '')
+    name = name.replace('|', '-')
+    return name
+
+def ProbeChapterTimes(path):
+    """
+    Returns the (start, end) times in seconds of the chapters of a media
+    file, using ffprobe.
+    """
+    probe_args = [
+        'ffprobe', '-v', 'error',
+        '-show_chapters',
+        '-of', 'json',
+        path
+    ]
+    result = subprocess.run(probe_args, capture_output=True, text=True,
+                            check=False)
+    if result.returncode != 0:
+        return []
+    try:
+        chapters = json.loads(result.stdout).get('chapters', [])
+        return [(float(c['start_time']), float(c['end_time']))
+                for c in chapters]
+    except (ValueError, KeyError):
+        return []
+
+def CutSegment(input_file, start, duration, output_file, verbose=False,
+               log_path=None):
+    """
+    Copies duration seconds of input_file, starting at start, into
+    output_file without re-encoding.
+
+    The cut starts at the keyframe at or before start, so start should be a
+    keyframe (HandBrake starts one at every chapter marker).
+    Raises subprocess.CalledProcessError if FFmpeg fails.
+    """
+    args = [
+        'ffmpeg',
+        '-v', 'error',
+        '-ss', '%.3f' % start,
+        '-i', input_file,
+        '-t', '%.3f' % duration,
+        '-map', '0',
+        '-map_chapters', '-1',
+        '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero',
+        '-movflags', '+faststart',
+        '-y',
+        output_file
+    ]
+    if verbose:
+        print(' '.join(args))
+    if log_path:
+        with open(log_path, 'ab') as log:
+            subprocess.check_call(args, stdout=log, stderr=subprocess.STDOUT)
+    else:
+        subprocess.run(args, check=True, capture_output=not verbose)
+
+# Resume journal
+
+JOURNAL_SUFFIX = '.dvdrip-journal.json'
+
+# How far an encode's duration may be off from the scanned duration while
+# still counting as complete. Scanned durations are whole seconds.
+RESUME_TOLERANCE_SECONDS = 2
+RESUME_TOLERANCE_RATIO = 0.01
+
+class RipJournal:
+    """
+    Records which tasks of a rip have been encoded, so that an interrupted
+    rip can be resumed.
+
+    The journal is a JSON file next to the output, holding the disc
+    fingerprint and, for each task, its title, chapter, output filename and
+    whether it has been encoded. A streamed rip adds tasks as their titles
+    are scanned, so its journal may only list the first tasks of the rip.
+    """
+    def __init__(self, path, fingerprint, tasks, filenames):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.entries = self.Entries(tasks, filenames)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def Entries(tasks, filenames):
+        return [{'title': task.title.number, 'chapter': task.chapter,
+                 'filename': filename, 'done': False}
+                for task, filename in zip(tasks, filenames)]
+
+    def Load(self):
+        """
+        Takes over completion from the journal on disk, and returns whether
+        there was one.
+
+        Raises UserError if the journal is for another disc or another set
+        of tasks.
+        """
+        try:
+            with open(self.path, 'r', encoding=CHAR_ENCODING) as f:
+                journal = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as exc:
+            raise UserError('cannot read journal %r: %s' % (self.path, exc))
+        if journal.get('fingerprint') != self.fingerprint:
+            raise UserError('journal %r is for a different disc'
+                            % self.path)
+
+        def Key(entry):
+            return (entry['title'], entry['chapter'], entry['filename'])
+        saved_keys = [Key(e) for e in journal.get('tasks', [])]
+        if saved_keys != list(map(Key, self.entries[:len(saved_keys)])):
+            raise UserError('journal %r is for different titles or output '
+                            'options' % self.path)
+        for entry, saved in zip(self.entries, journal['tasks']):
+            entry['done'] = bool(saved.get('done'))
+        return True
+
+    def Save(self):
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding=CHAR_ENCODING) as f:
+            json.dump({'fingerprint': self.fingerprint,
+                       'tasks': self.entries}, f, indent=1)
+        os.replace(temp_path, self.path)
+
+    def IsDone(self, i):
+        return self.entries[i]['done']
+
+    def Add(self, tasks, filenames):
+        with self.lock:
+            self.entries += self.Entries(tasks, filenames)
+            self.Save()
+
+    def MarkDone(self, i):
+        with self.lock:
+            self.entries[i]['done'] = True
+            self.Save()
+
+    def Remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def IsCompleteEncode(task, filename):
+    """
+    Returns whether filename holds a complete encode of task, judged by
+    comparing its duration with the scanned duration of the task.
+    """
+    info = ProbeMedia(filename)
+    if info is None:
+        return False
+    expected = TaskSeconds(task)
+    tolerance = max(RESUME_TOLERANCE_SECONDS,
+                    expected * RESUME_TOLERANCE_RATIO)
+    return abs(info.duration - expected) <= tolerance
+
+def ResumeTasks(journal, tasks, filenames, verbose=False):
+    """
+    Returns the indices of tasks that still need to be encoded.
+
+    Outputs whose duration checks out as a complete encode are kept and
+    marked done in the journal, whether or not the journal already recorded
+    them; a rip that finished (and so removed its journal) or was streamed
+    can therefore be resumed too. Only incomplete outputs are removed so
+    that they can be encoded again.
+    """
+    remaining = []
+    for i, (task, filename) in enumerate(zip(tasks, filenames)):
+        if not os.path.exists(filename):
+            remaining.append(i)
+        elif IsCompleteEncode(task, filename):
+            if verbose:
+                print('[dvdrip] Already encoded: %r' % filename)
+            if not journal.IsDone(i):
+                journal.MarkDone(i)
+        else:
+            warn('%r is incomplete, encoding it again.' % filename)
+            os.remove(filename)
+            remaining.append(i)
+    return remaining
+
+MediaInfo = namedtuple('MediaInfo', 'duration video audio subtitles')
+
+def ProbeMedia(path):
+    """
+    Returns a MediaInfo describing the streams of a media file, or None if
+    ffprobe can't read it.
+
+    video is a (codec, tag, profile, pixel format, width, height, sample
+    aspect ratio, frame rate) tuple, or None. audio is a tuple of (codec,
+    channels, channel layout, sample rate) tuples, one per audio stream, and
+    subtitles is a tuple of subtitle codec names. Files whose video, audio
+    and subtitles compare equal can be concatenated without re-encoding.
+    """
+    probe_args = [
+        'ffprobe', '-v', 'error',
+        '-show_entries',
+        'format=duration:stream=codec_type,codec_name,codec_tag_string,'
+        'profile,pix_fmt,width,height,sample_aspect_ratio,r_frame_rate,'
+        'channels,channel_layout,sample_rate',
+        '-of', 'json',
+        path
+    ]
+    result = subprocess.run(probe_args, capture_output=True, text=True,
+                            check=False)
+    if result.returncode != 0:
+        return None
+    try:
+        probe = json.loads(result.stdout)
+        video = None
+        audio = []
+        subtitles = []
+        for stream in probe.get('streams', []):
+            codec_type = stream.get('codec_type')
+            if codec_type == 'video' and video is None:
+                video = (stream.get('codec_name'),
+                         stream.get('codec_tag_string'),
+                         stream.get('profile'), stream.get('pix_fmt'),
+                         int(stream['width']), int(stream['height']),
+                         stream.get('sample_aspect_ratio', '1:1'),
+                         stream.get('r_frame_rate'))
+            elif codec_type == 'audio':
+                audio.append((stream.get('codec_name'),
+                              stream.get('channels'),
+                              stream.get('channel_layout'),
+                              stream.get('sample_rate')))
+            elif codec_type == 'subtitle':
+                subtitles.append(stream.get('codec_name'))
+        duration = float(probe.get('format', {}).get('duration', 0))
+    except (ValueError, KeyError):
+        return None
+    return MediaInfo(duration, video, tuple(audio), tuple(subtitles))
+
+def ConcatFileLine(path):
+    # The concat demuxer's quoting: close the quote, escape, reopen it.
+    return "file '%s'\n" % os.path.abspath(path).replace("'", "'\\''")
+
+def concat_mp4_files(input_files, output_file, verbose=False):
+    """
+    Join MP4 files with identical stream layouts using the FFmpeg concat
+    demuxer, copying all streams without re-encoding.
+
+    Returns:
+        True if successful, False otherwise
+    """
+    fd, list_file = tempfile.mkstemp(prefix='dvdrip_concat_', suffix='.txt')
+    try:
+        with os.fdopen(fd, 'w', encoding=CHAR_ENCODING) as f:
+            for input_file in input_files:
+                f.write(ConcatFileLine(input_file))
+
+        args = [
+            'ffmpeg',
+            '-f', 'concat',
+            '-safe', '0',
+            '-i', list_file,
+            '-map', '0',
+            '-c', 'copy',
+            '-movflags', '+faststart',
+            '-y',  # Overwrite output
+            output_file
+        ]
+
+        if verbose:
+            print(f"[dvdrip] Joining {len(input_files)} files into {output_file} (stream copy)")
+            print(' '.join(args))
+            result = subprocess.run(args, check=False)
+        else:
+            result = subprocess.run(args, capture_output=True, check=False)
+    finally:
+        os.remove(list_file)
+
+    if result.returncode != 0:
+        if not verbose and result.stderr:
+            warn(f"FFmpeg error: {result.stderr.decode('utf-8', errors='replace')}")
+        return False
+    return True
+
+# FFmpeg encoders that produce streams matching what ffprobe reports for
+# these codecs.
+CONFORM_VIDEO_ENCODERS = {'hevc': 'libx265', 'h264': 'libx264'}
+CONFORM_AUDIO_ENCODERS = {'ac3': 'ac3', 'eac3': 'eac3', 'aac': 'aac',
+                          'mp2': 'mp2', 'mp3': 'libmp3lame'}
+
+def conform_mp4_file(input_file, target, output_file, verbose=False):
+    """
+    Re-encode input_file so that its streams match target, a MediaInfo of
+    the layout the other join inputs share.
+
+    Returns:
+        True if successful, False if the file can't be conformed
+    """
+    codec, tag, _, pix_fmt, width, height, sar, frame_rate = target.video
+    info = ProbeMedia(input_file)
+    if (codec not in CONFORM_VIDEO_ENCODERS
+            or not info or len(info.audio) < len(target.audio)
+            or info.subtitles != target.subtitles
+            or any(a[0] not in CONFORM_AUDIO_ENCODERS for a in target.audio)):
+        return False
+
+    args = [
+        'ffmpeg',
+        '-i', input_file,
+        '-map', '0:v:0',
+    ]
+    for a in range(len(target.audio)):
+        args += ['-map', f'0:a:{a}']
+    if target.subtitles:
+        args += ['-map', '0:s', '-c:s', 'copy']
+    args += [
+        '-vf', f"scale={width}:{height},setsar={sar.replace(':', '/')},fps={frame_rate}",
+        '-pix_fmt', pix_fmt,
+        # Video encoding - match original dvdrip settings
+        '-c:v', CONFORM_VIDEO_ENCODERS[codec],
+        '-crf', '16',
+        '-preset', 'medium',
+    ]
+    if tag and not tag.startswith('['):
+        args += ['-tag:v', tag]
+    for a, (audio_codec, channels, _, sample_rate) in enumerate(target.audio):
+        args += [f'-c:a:{a}', CONFORM_AUDIO_ENCODERS[audio_codec],
+                 f'-ac:a:{a}', str(channels), f'-ar:a:{a}', str(sample_rate)]
+    args += ['-y', output_file]
 
-def ParseSubtitleTracks(d):
-    for number, info in sorted(((int(n), info) for (n, info) in d.items())):
-        yield SubtitleTrack(number, info)
+    if verbose:
+        print(f"[dvdrip] Re-encoding {input_file} to match the other files")
+        print(' '.join(args))
+        result = subprocess.run(args, check=False)
+    else:
+        result = subprocess.run(args, capture_output=True, check=False)
 
-def RenderBar(start, length, total, width):
-    end = start + length
-    start = int(round(start * (width - 1) / total))
-    length = int(round(end * (width - 1) / total)) - start + 1
-    return ('‥' * start +
-            '■' * length +
-            '‥' * (width - start - length))
+    if result.returncode != 0:
+        if not verbose and result.stderr:
+            warn(f"FFmpeg error: {result.stderr.decode('utf-8', errors='replace')}")
+        return False
 
-MAX_BAR_WIDTH = 50
+    # Encoder defaults can still differ from the target (eg: the profile),
+    # in which case the conformed file is of no use to the concat demuxer.
+    conformed = ProbeMedia(output_file)
+    return bool(conformed) and conformed[1:] == target[1:]
 
-# TMDb metadata functions
-def load_tmdb_api_key():
-    """Load TMDb API key from file or environment variable."""
-    # Try environment variable first
-    api_key = os.environ.get('TMDB_API_KEY')
-    if api_key:
-        return api_key
+def smart_join_mp4_files(input_files, infos, output_file, verbose=False):
+    """
+    Join files whose layouts differ by re-encoding only the files that
+    don't match the layout covering most of the running time, then
+    concatenating everything with a stream copy.
 
-    # Try config file
-    config_file = os.path.expanduser('~/.tmdb_api_key')
-    if os.path.exists(config_file):
-        with open(config_file, 'r') as f:
-            return f.read().strip()
+    Returns:
+        True if successful, False otherwise
+    """
+    runtime = {}
+    for info in infos:
+        runtime[info[1:]] = runtime.get(info[1:], 0) + info.duration
+    target = max(infos, key=lambda info: runtime[info[1:]])
 
-    return None
+    temp_dir = tempfile.mkdtemp(prefix='.dvdrip_join_',
+                                dir=os.path.dirname(output_file) or '.')
+    try:
+        segments = []
+        for i, (input_file, info) in enumerate(zip(input_files, infos)):
+            if info[1:] == target[1:]:
+                segments.append(input_file)
+                continue
+            conformed = os.path.join(temp_dir, '%03d.mp4' % i)
+            if not conform_mp4_file(input_file, target, conformed,
+                                    verbose=verbose):
+                return False
+            segments.append(conformed)
+        return concat_mp4_files(segments, output_file, verbose=verbose)
+    finally:
+        for name in os.listdir(temp_dir):
+            os.remove(os.path.join(temp_dir, name))
+        os.rmdir(temp_dir)
+
+def ParseJoinTitles(join_titles_arg):
+    """Parse the --join-titles argument into a set of title numbers."""
+    join_title_nums = set()
+    for part in join_titles_arg.split(','):
+        part = part.strip()
+        if part.isdigit():
+            join_title_nums.add(int(part))
+        else:
+            warn(f"Invalid title number in --join-titles: {part}")
+    return join_title_nums
 
-def sanitize_filename(name):
-    """Remove/replace characters that are invalid in filenames."""
-    # Replace problematic characters with safe ones
-    name = name.replace('/', '-')
-    name = name.replace('\\', '-')
-    name = name.replace(':', '-')
-    name = name.replace('*', '')
-    name = name.replace('?', '')
-    name = name.replace('"', "'")
-    name = name.replace('<', '')
-    name = name.replace('>', '')
-    name = name.replace('|', '-')
-    return name
+def JoinedOutputName(filenames, metadata=None):
+    """
+    Generate the output filename for a joined file (same directory as
+    individual files).
+    """
+    output_dir = os.path.dirname(filenames[0]) if filenames else '.'
+    if not output_dir:
+        output_dir = '.'
+
+    if metadata and metadata.get('title'):
+        base_name = sanitize_filename(metadata['title'])
+        if metadata.get('year'):
+            base_name = f"{base_name} ({metadata['year']})"
+        return os.path.join(output_dir, f"{base_name} - Joined.mp4")
+    return os.path.join(output_dir, "Joined.mp4")
 
 def join_mp4_files(input_files, output_file, verbose=False):
     """
-    Join multiple MP4 files into a single file using FFmpeg concat filter with re-encoding.
+    Join multiple MP4 files into a single file.
 
-    Uses re-encoding for reliable joining without artifacts at segment boundaries.
+    If all inputs have the same codecs, resolution, SAR, frame rate and
+    audio and subtitle layout (which is the case when they all came out of
+    RipTitle), they are concatenated with a stream copy. If only some of
+    them differ, just those are re-encoded to match before concatenating.
+    Failing that, everything is joined with the FFmpeg concat filter and
+    re-encoded.
 
     Args:
         input_files: List of input file paths to join (in order)
@@ -802,24 +2952,31 @@ def join_mp4_files(input_files, output_file, verbose=False):
             warn(f"Input file not found: {f}")
             return False
 
-    # Build the complex filter for concat
-    # First, probe the first file to get target dimensions
-    probe_args = [
-        'ffprobe', '-v', 'error',
-        '-select_streams', 'v:0',
-        '-show_entries', 'stream=width,height',
-        '-of', 'csv=p=0',
-        input_files[0]
-    ]
-    probe_result = subprocess.run(probe_args, capture_output=True, text=True, check=False)
-    if probe_result.returncode == 0 and probe_result.stdout.strip():
-        target_width, target_height = probe_result.stdout.strip().split(',')
-        target_width = int(target_width)
-        target_height = int(target_height)
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(len(input_files), 8)) as executor:
+        infos = list(executor.map(ProbeMedia, input_files))
+    if all(info and info.video for info in infos):
+        if len(set(info[1:] for info in infos)) == 1:
+            if concat_mp4_files(input_files, output_file, verbose=verbose):
+                return True
+        elif smart_join_mp4_files(input_files, infos, output_file,
+                                  verbose=verbose):
+            return True
+        warn("Stream copy join failed, re-encoding everything instead.")
+
+    # Take the target dimensions from the first file
+    if infos[0] and infos[0].video:
+        target_width, target_height = infos[0].video[4:6]
     else:
         # Default to standard DVD PAL resolution
         target_width, target_height = 720, 576
 
+    # Keep as many audio tracks as every input has
+    if all(infos):
+        audio_count = min(len(info.audio) for info in infos)
+    else:
+        audio_count = 1
+
     # Build inputs and filter that scales each video to match dimensions
     inputs = []
     filter_parts = []
@@ -829,16 +2986,23 @@ def join_mp4_files(input_files, output_file, verbose=False):
         inputs.extend(['-i', f])
         # Scale video to target size, then set SAR to 1:1 for consistent concatenation
         filter_parts.append(f'[{i}:v:0]scale={target_width}:{target_height}:force_original_aspect_ratio=disable,setsar=1[v{i}]')
-        concat_inputs.append(f'[v{i}][{i}:a:0]')
+        concat_inputs.append(f'[v{i}]' + ''.join(
+            f'[{i}:a:{a}]' for a in range(audio_count)))
 
-    filter_complex = ';'.join(filter_parts) + ';' + ''.join(concat_inputs) + f'concat=n={len(input_files)}:v=1:a=1[outv][outa]'
+    audio_outputs = [f'[outa{a}]' for a in range(audio_count)]
+    filter_complex = (';'.join(filter_parts) + ';' + ''.join(concat_inputs) +
+                      f'concat=n={len(input_files)}:v=1:a={audio_count}[outv]' +
+                      ''.join(audio_outputs))
 
     args = [
         'ffmpeg',
         *inputs,
         '-filter_complex', filter_complex,
         '-map', '[outv]',
-        '-map', '[outa]',
+    ]
+    for audio_output in audio_outputs:
+        args += ['-map', audio_output]
+    args += [
         # Video encoding - match original dvdrip settings
         '-c:v', 'libx265',
         '-crf', '16',  # Match original dvdrip quality
@@ -866,8 +3030,16 @@ def join_mp4_files(input_files, output_file, verbose=False):
 
     return True
 
-def search_tmdb(query, year=None, is_tv=False):
-    """Search TMDb for a movie or TV show."""
+# TMDb responses are cached on disk, so discs of the same series or a rip
+# that is run again don't repeat the same lookups.
+TMDB_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+TMDB_CACHE_MAX_BYTES = 2 * 1024 * 1024
+
+def tmdb_module():
+    """
+    Import tmdbsimple, set up with the API key and a keep-alive session
+    shared by all requests.
+    """
     if not TMDB_AVAILABLE:
         raise RuntimeError("tmdbsimple not installed. Install with: pip install tmdbsimple")
 
@@ -878,17 +3050,64 @@ def search_tmdb(query, year=None, is_tv=False):
             "save your API key to ~/.tmdb_api_key"
         )
 
+    import tmdbsimple as tmdb
     tmdb.API_KEY = api_key
+    if getattr(tmdb, 'REQUESTS_SESSION', None) is None:
+        import requests
+        tmdb.REQUESTS_SESSION = requests.Session()
+    return tmdb
+
+def tmdb_object(obj):
+    """
+    Set up a tmdbsimple object to keep its connection alive, and point it
+    at TMDB_BASE_URI, if set (eg: a stand-in server).
+    """
+    # tmdbsimple asks for every connection to be closed, which would make
+    # the shared session reconnect for each request.
+    obj.headers = dict(obj.headers, Connection='keep-alive')
+    base_uri = os.environ.get('TMDB_BASE_URI')
+    if base_uri:
+        obj.base_uri = base_uri.rstrip('/')
+    return obj
+
+def cached_tmdb_call(key, fetch):
+    """
+    Return fetch(), or the cached result for key if it is recent enough.
 
+    If fetch() fails, an expired cached result is returned instead, so
+    lookups that have been made before also work offline.
+    """
+    cache = DiskCache(os.path.join(CACHE_DIR, 'tmdb'), TMDB_CACHE_MAX_BYTES)
+    entry = cache.Get(key)
+    if entry and time.time() - entry['time'] < TMDB_CACHE_TTL_SECONDS:
+        return entry['value']
     try:
+        value = fetch()
+    except Exception as e:
+        if entry is None:
+            raise
+        warn(f"TMDb lookup failed, using cached result: {e}")
+        return entry['value']
+    cache.Put(key, {'time': time.time(), 'value': value})
+    return value
+
+def search_tmdb(query, year=None, is_tv=False):
+    """Search TMDb for a movie or TV show."""
+    def fetch():
+        tmdb = tmdb_module()
+        search = tmdb_object(tmdb.Search())
         if is_tv:
-            search = tmdb.Search()
             results = search.tv(query=query, first_air_date_year=year)
-            return results['results']
         else:
-            search = tmdb.Search()
             results = search.movie(query=query, year=year)
-            return results['results']
+        return results['results']
+
+    key = 'search:%s:%s:%s' % ('tv' if is_tv else 'movie',
+                               query.strip().lower(), year or '')
+    try:
+        return cached_tmdb_call(key, fetch)
+    except RuntimeError:
+        raise
     except Exception as e:
         warn(f"TMDb search failed: {e}")
         return []
@@ -942,43 +3161,214 @@ def select_tmdb_result(results, is_tv=False):
             print("\nSkipping metadata.")
             return None
 
+def tmdb_info(tmdb_id, is_tv=False):
+    """Get the TMDb details of a movie or TV show."""
+    def fetch():
+        tmdb = tmdb_module()
+        if is_tv:
+            return tmdb_object(tmdb.TV(tmdb_id)).info()
+        return tmdb_object(tmdb.Movies(tmdb_id)).info()
+
+    key = 'info:%s:%s' % ('tv' if is_tv else 'movie', tmdb_id)
+    return cached_tmdb_call(key, fetch)
+
 def get_metadata_by_id(tmdb_id, is_tv=False):
     """Get metadata from TMDb using a specific TMDb ID."""
-    if not TMDB_AVAILABLE:
-        raise RuntimeError("tmdbsimple not installed. Install with: pip install tmdbsimple")
+    try:
+        info = tmdb_info(tmdb_id, is_tv=is_tv)
+    except RuntimeError:
+        raise
+    except Exception as e:
+        warn(f"TMDb ID lookup failed: {e}")
+        return None
 
-    api_key = load_tmdb_api_key()
-    if not api_key:
-        raise RuntimeError(
-            "TMDb API key not found. Set TMDB_API_KEY environment variable or "
-            "save your API key to ~/.tmdb_api_key"
-        )
+    if is_tv:
+        title = info.get('name', 'Unknown')
+        year = info.get('first_air_date', '')[:4]
+    else:
+        title = info.get('title', 'Unknown')
+        year = info.get('release_date', '')[:4]
 
-    tmdb.API_KEY = api_key
+    return {
+        'title': title,
+        'year': year,
+        'tmdb_id': tmdb_id
+    }
+
+def prefetch_tmdb_search(query, year=None, is_tv=False):
+    """
+    Start search_tmdb in the background and return a Future of its results.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(search_tmdb, query, year=year, is_tv=is_tv)
+    executor.shutdown(wait=False)
+    return future
+
+def metadata_query(args):
+    """
+    Return what to search TMDb for: --title-search or, with --auto-metadata,
+    the name of the output.
+    """
+    if args.title_search:
+        return args.title_search
+    if args.auto_metadata and args.output:
+        return disc_search_name(os.path.splitext(os.path.basename(
+                os.path.normpath(args.output)))[0])
+    return None
 
+def disc_search_name(name):
+    """
+    Turn a file or volume name like "THE_MATRIX_DISC_1" into something to
+    search TMDb for, or None.
+    """
+    name = re.sub(r'[_.]+', ' ', name)
+    # Drop disc and season numbers, as in "Show S01 D2" or "Movie Disc 1".
+    name = re.sub(r'[\s-]*\b(?:disc|disk|d)\s*\d+\s*$', '', name,
+                  flags=re.IGNORECASE)
+    name = re.sub(r'[\s-]+(?:season\s*|s)\d+\s*$', '', name,
+                  flags=re.IGNORECASE)
+    return name.strip() or None
+
+def lookup_metadata(args, prompt, prefetched=None, titles=()):
+    """
+    Get metadata for the disc as asked for on the command line: search TMDb
+    for --title-search (using the prefetched search, if any), or else offer
+    to search if TMDb is set up. With --auto-metadata, the best match is
+    picked without asking, using titles to compare runtimes. Returns None
+    if there is no metadata.
+    """
+    if args.no_metadata:
+        return None
     try:
-        if is_tv:
-            item = tmdb.TV(tmdb_id)
-            info = item.info()
-            title = info.get('name', 'Unknown')
-            year = info.get('first_air_date', '')[:4]
-        else:
-            item = tmdb.Movies(tmdb_id)
-            info = item.info()
-            title = info.get('title', 'Unknown')
-            year = info.get('release_date', '')[:4]
-
-        return {
-            'title': title,
-            'year': year,
-            'tmdb_id': tmdb_id
-        }
+        if args.auto_metadata:
+            query = metadata_query(args)
+            if not query:
+                return None
+            if query.isdigit():
+                return get_metadata_by_id(int(query), is_tv=args.tv)
+            print(f"[dvdrip] Matching '{query}' against TMDb...")
+            longest = max((title.duration.in_seconds() for title in titles),
+                          default=0)
+            return auto_metadata_from_tmdb(
+                query, year=args.year, is_tv=args.tv,
+                runtime_minutes=longest / 60 or None,
+                results=prefetched.result() if prefetched else None)
+        if args.title_search:
+            # User provided a search query
+            print(f"[dvdrip] Searching TMDb for '{args.title_search}'...")
+            return get_metadata_from_tmdb(
+                search_query=args.title_search,
+                year=args.year,
+                is_tv=args.tv,
+                results=prefetched.result() if prefetched else None
+            )
+        elif TMDB_AVAILABLE and load_tmdb_api_key():
+            # API is available, offer to search
+            print(f"\n[dvdrip] TMDb metadata available. {prompt}")
+            response = input("Search TMDb? (y/n): ").strip().lower()
+            if response in ('y', 'yes'):
+                return get_metadata_from_tmdb(
+                    year=args.year,
+                    is_tv=args.tv
+                )
     except Exception as e:
-        warn(f"TMDb ID lookup failed: {e}")
+        warn(f"Metadata lookup failed: {e}")
+    return None
+
+# How sure --auto-metadata must be of a match, from 0 to 1, to use it.
+AUTO_METADATA_MIN_SCORE = 0.75
+
+# How many of the most similarly named results to fetch runtimes for.
+AUTO_METADATA_CANDIDATES = 5
+
+def normalize_title(title):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', title.lower()).split())
+
+def title_similarity(a, b):
+    """How similar two titles are, from 0 to 1."""
+    import difflib
+    return difflib.SequenceMatcher(
+            None, normalize_title(a), normalize_title(b)).ratio()
+
+def score_tmdb_result(result, query, year=None, is_tv=False,
+                      runtime_minutes=None):
+    """
+    Score how well a TMDb search result matches, from 0 to 1.
+
+    Combines how similar its title is to query, how close its year is to
+    year, and (for movies) how close its runtime is to runtime_minutes.
+    Whatever isn't known is left out of the score.
+    """
+    name = result.get('name' if is_tv else 'title', '')
+    date = result.get('first_air_date' if is_tv else 'release_date', '')
+    parts = [(0.6, title_similarity(query, name))]
+    if year and date[:4].isdigit():
+        parts.append((0.2, max(0.0, 1 - abs(int(date[:4]) - year) / 2)))
+    if runtime_minutes and not is_tv:
+        # Episodes don't have one runtime to compare against the disc's
+        # longest title, so only movies are compared.
+        try:
+            runtime = tmdb_info(result['id']).get('runtime')
+        except Exception as e:
+            warn(f"TMDb details lookup failed: {e}")
+            runtime = None
+        if runtime:
+            parts.append((0.2, max(0.0, 1 - abs(runtime - runtime_minutes)
+                                       / max(runtime, runtime_minutes))))
+    return sum(w * s for w, s in parts) / sum(w for w, _ in parts)
+
+def auto_metadata_from_tmdb(query, year=None, is_tv=False,
+                            runtime_minutes=None, results=None):
+    """
+    Get metadata for the TMDb search result that best matches query, year
+    and runtime_minutes, without asking. Returns None if no result scores
+    at least AUTO_METADATA_MIN_SCORE.
+
+    If results are given, they are used instead of searching again.
+    """
+    if results is None:
+        results = search_tmdb(query, year=year, is_tv=is_tv)
+    name_key = 'name' if is_tv else 'title'
+    candidates = sorted(results, reverse=True, key=lambda r:
+            title_similarity(query, r.get(name_key, '')))[
+                    :AUTO_METADATA_CANDIDATES]
+    scored = [(score_tmdb_result(r, query, year, is_tv, runtime_minutes), r)
+              for r in candidates]
+    if not scored:
+        print(f"[dvdrip] No TMDb results for '{query}'.")
         return None
+    score, best = max(scored, key=lambda s: s[0])
+    if score < AUTO_METADATA_MIN_SCORE:
+        print(f"[dvdrip] No confident TMDb match for '{query}' "
+              f"(best: {best.get(name_key, 'Unknown')}, score {score:.2f}).")
+        return None
+    print(f"[dvdrip] Matched {best.get(name_key, 'Unknown')} "
+          f"(score {score:.2f}).")
+    return tmdb_result_metadata(best, is_tv)
+
+def tmdb_result_metadata(result, is_tv=False):
+    """Return a clean metadata dict for a TMDb search result."""
+    if is_tv:
+        title = result.get('name', 'Unknown')
+        year = result.get('first_air_date', '')[:4]
+    else:
+        title = result.get('title', 'Unknown')
+        year = result.get('release_date', '')[:4]
 
-def get_metadata_from_tmdb(search_query=None, year=None, is_tv=False):
-    """Get metadata from TMDb by searching for a title."""
+    return {
+        'title': title,
+        'year': year,
+        'tmdb_id': result.get('id')
+    }
+
+def get_metadata_from_tmdb(search_query=None, year=None, is_tv=False,
+                           results=None):
+    """
+    Get metadata from TMDb by searching for a title.
+
+    If results are given, they are used instead of searching again.
+    """
     if not search_query:
         search_query = input("Enter movie/TV show title (or TMDb ID): ").strip()
         if not search_query:
@@ -989,7 +3379,8 @@ def get_metadata_from_tmdb(search_query=None, year=None, is_tv=False):
         print(f"[dvdrip] Looking up TMDb ID {search_query}...")
         return get_metadata_by_id(int(search_query), is_tv=is_tv)
 
-    results = search_tmdb(search_query, year=year, is_tv=is_tv)
+    if results is None:
+        results = search_tmdb(search_query, year=year, is_tv=is_tv)
     if not results:
         print("\nNo results found. Try a different search term or use the TMDb ID.")
         print("Tip: Find the TMDb ID in the URL, e.g., themoviedb.org/movie/111160")
@@ -1003,23 +3394,11 @@ def get_metadata_from_tmdb(search_query=None, year=None, is_tv=False):
     if selected.get('_use_id'):
         return get_metadata_by_id(selected['id'], is_tv=is_tv)
 
-    # Return a clean metadata dict
-    if is_tv:
-        title = selected.get('name', 'Unknown')
-        year = selected.get('first_air_date', '')[:4]
-    else:
-        title = selected.get('title', 'Unknown')
-        year = selected.get('release_date', '')[:4]
-
-    return {
-        'title': title,
-        'year': year,
-        'tmdb_id': selected.get('id')
-    }
+    return tmdb_result_metadata(selected, is_tv)
 
 def DisplayScan(titles, metadata=None):
     max_title_seconds = max(
-                    title.info['duration'].in_seconds()
+                    title.duration.in_seconds()
                     for title in titles)
 
     # Display metadata if available
@@ -1030,23 +3409,22 @@ def DisplayScan(titles, metadata=None):
         print()
 
     for title in titles:
-        info = title.info
-        size = ParseSize(info['size'])
+        size = title.size
         xaspect, yaspect = ComputeAspectRatio(size)
-        duration = info['duration']
+        duration = title.duration
         title_seconds = duration.in_seconds()
         print('Title % 3d/% 3d: %s  %d×%d  %d:%d  %3g fps' %
                 (title.number, len(titles), duration, size.width,
                     size.height, xaspect, yaspect, size.fps))
-        for at in ParseAudioTracks(info['audio tracks']):
+        for at in title.audio_tracks:
             print('  audio % 3d: %s (%sch)  [%s]' %
                     (at.number, at.lang, at.channels, at.extras))
-        for sub in ParseSubtitleTracks(info['subtitle tracks']):
+        for sub in title.subtitle_tracks:
             print('  sub % 3d: %s' %
                     (sub.number, sub.info))
         position = 0
         if title_seconds > 0:
-            for chapter in ParseChapters(info['chapters']):
+            for chapter in title.chapters:
                 seconds = chapter.duration.in_seconds()
                 bar_width = int(round(
                     MAX_BAR_WIDTH * title_seconds / max_title_seconds))
@@ -1056,6 +3434,17 @@ def DisplayScan(titles, metadata=None):
                 position += seconds
         print()
 
+def positive_int(value):
+    """argparse type for counts that must be at least 1."""
+    try:
+        result = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError('%r is not an integer' % value)
+    if result < 1:
+        raise argparse.ArgumentTypeError('must be at least 1, not %d'
+                                         % result)
+    return result
+
 def ParseArgs():
     description, epilog = __doc__.strip().split('\n', 1)
     parser = argparse.ArgumentParser(description=description, epilog=epilog,
@@ -1066,12 +3455,54 @@ def ParseArgs():
     parser.add_argument('-c', '--chapter_split',
             action='store_true',
             help="Split each chapter out into a separate file.")
+    parser.add_argument('--split-mode',
+            choices=('encode', 'cut'),
+            default='encode',
+            help="""How --chapter_split produces chapters: 'encode' runs one
+            encode per chapter, 'cut' encodes each title once and cuts the
+            chapters out of it with FFmpeg, without re-encoding.""")
     parser.add_argument('-n', '--dry-run',
             action='store_true',
             help="Don't actually write anything.")
+    parser.add_argument('-j', '--jobs',
+            type=positive_int,
+            default=1,
+            help="""Number of encodes to run at once. With more than one,
+            each encode logs to a file next to its output.""")
     parser.add_argument('--scan',
             action='store_true',
             help="Display scan of disc; do not rip.")
+    parser.add_argument('--per-title-scan',
+            action='store_true',
+            help="""Scan each title with a separate HandBrakeCLI process
+            instead of scanning the whole disc at once.""")
+    parser.add_argument('--scan-jobs',
+            type=positive_int,
+            default=1,
+            help="""Number of titles to scan concurrently when titles are
+            scanned one HandBrakeCLI process at a time. Values above 1 are
+            best kept for disc images on fast storage.""")
+    parser.add_argument('--scanner',
+            choices=('auto', 'ifo', 'handbrake'),
+            default='auto',
+            help="""How to scan the disc: read the IFO files directly, run
+            HandBrakeCLI, or try the IFO files first (the default).""")
+    parser.add_argument('--rescan',
+            action='store_true',
+            help="Ignore any cached scan of this disc and scan it again.")
+    parser.add_argument('--resume',
+            action='store_true',
+            help="""Continue an interrupted rip into the same output, only
+            encoding the tasks that are missing or incomplete.""")
+    parser.add_argument('--dedupe',
+            action='store_true',
+            help="""Skip titles that play the same content as an earlier
+            title, as on discs that hide the main feature among dozens of
+            decoy playlists.""")
+    parser.add_argument('--min-title-seconds',
+            type=float,
+            default=0,
+            help="Skip titles shorter than this many seconds.")
     parser.add_argument('--main-feature',
             action='store_true',
             help="Rip only the main feature title.")
@@ -1088,6 +3519,32 @@ def ParseArgs():
             help="""Output location. Extension is added if only one title
             being ripped, otherwise, a directory will be created to contain
             ripped titles.""")
+    parser.add_argument('--stage-dir',
+            help="""Copy the disc into this directory first and encode from
+            the copy, ejecting the disc as soon as an encode of the copy has
+            succeeded. The copy is removed after a successful rip.""")
+    parser.add_argument('--keep-stage',
+            action='store_true',
+            help="""Keep the copy made with --stage-dir after ripping.""")
+    parser.add_argument('--daemon',
+            action='store_true',
+            help="""Keep running, and rip every disc inserted into any
+            optical drive into its own directory under the output
+            directory, named after the disc's volume label.""")
+    parser.add_argument('--batch',
+            action='append',
+            metavar='PATH',
+            help="""Rip every ISO file and folder containing VIDEO_TS found
+            in PATH (a directory or glob; may be repeated), each into its
+            own directory under the output directory.""")
+    parser.add_argument('--parallel-discs',
+            type=positive_int,
+            default=max(1, (os.cpu_count() or 1) // CORES_PER_ENCODE),
+            help="""Number of discs to rip at once with --daemon or --batch
+            (default: one per %d CPU cores).""" % CORES_PER_ENCODE)
+    parser.add_argument('--no-eject',
+            action='store_true',
+            help="Leave the disc in the drive when done.")
     parser.add_argument('--mount-timeout',
             default=15,
             help="Amount of time to wait for a mountpoint to be mounted",
@@ -1100,6 +3557,12 @@ def ParseArgs():
     parser.add_argument('--tv',
             action='store_true',
             help="Search for TV show instead of movie")
+    parser.add_argument('--auto-metadata',
+            action='store_true',
+            help="""Pick the best TMDb match without asking, comparing titles,
+            years and runtimes, and skip metadata if no match is close enough.
+            Searches for --title-search, or else the output name (or the
+            disc label, with --daemon).""")
     parser.add_argument('--no-metadata',
             action='store_true',
             help="Skip metadata lookup and use default naming")
@@ -1112,11 +3575,28 @@ def ParseArgs():
     parser.add_argument('--join-titles',
             help="""Comma-separated list of title numbers to join into a single
             file (e.g., '1,2,3'). Implies joining.""")
+    parser.add_argument('--join-mode',
+            choices=('encode', 'source'),
+            default='encode',
+            help="""How to join titles: 'encode' encodes each title and then
+            joins the results, 'source' concatenates the titles' streams
+            from the disc and encodes them once. 'source' needs the titles
+            to be in the same title set.""")
     parser.add_argument('--keep-files',
             action='store_true',
             help="Keep individual files after joining (default: delete them)")
     args = parser.parse_args()
 
+    if args.daemon and args.batch:
+        raise UserError("--daemon and --batch cannot be combined")
+    if args.daemon or args.batch:
+        mode = '--daemon' if args.daemon else '--batch'
+        if args.output is None:
+            raise UserError("%s needs an output directory" % mode)
+        if args.scan or args.input:
+            raise UserError("%s cannot be combined with --scan or --input"
+                            % mode)
+        return args
     if not args.input:
         try:
             args.input = find_optical_drive_device(prefer_with_media=True)
@@ -1155,12 +3635,443 @@ def parse_titles_arg(titles_arg):
         result = sorted(list(result))
         return result
 
+# Streaming scan and encode
+
+def CanStreamTitles(args, title_numbers):
+    """
+    Returns whether titles can be encoded as soon as they've been scanned.
+
+    That needs an explicit list of titles, and nothing that has to see all
+    of them before encoding: picking the main feature, filtering titles,
+    automatic metadata matching, resuming, or joining at the source.
+    """
+    return (not args.scan and title_numbers is not None
+            and len(title_numbers) > 1
+            and not args.main_feature and not args.auto_metadata
+            and not args.dedupe and not args.min_title_seconds
+            and not args.resume
+            and not ((args.join or args.join_titles)
+                     and args.join_mode == 'source'))
+
+def ScanTitleStream(dvd, title_numbers, args):
+    """
+    Starts scanning the given titles one at a time in a background thread.
+
+    Returns an iterator that yields each Title as soon as it has been
+    scanned. The scan starts right away, so it runs while the caller does
+    other things (like asking about metadata) before iterating.
+    """
+    scanned = queue.Queue()
+
+    def Scan():
+        try:
+            for number in title_numbers:
+                for title in CachedScanTitles(dvd, [number], args.verbose,
+                        rescan=args.rescan, scanner=args.scanner):
+                    scanned.put(title)
+        except Exception as exc:
+            scanned.put(exc)
+        finally:
+            scanned.put(None)
+
+    def Titles():
+        while True:
+            title = scanned.get()
+            if title is None:
+                return
+            if isinstance(title, Exception):
+                raise title
+            yield title
+
+    threading.Thread(target=Scan, daemon=True).start()
+    return Titles()
+
+def RipTitleStream(dvd, args, title_stream, title_count, metadata,
+                   journal=None, on_complete=None):
+    """
+    Encodes the titles from title_stream as they arrive, while the next
+    ones are scanned.
+
+    Up to args.jobs encodes run at once, across titles; with more than one,
+    each logs to its own file next to its output. Tasks are added to
+    journal (if given) as their titles arrive, and marked done as soon as
+    they have been encoded; on_complete (if given) is then called with the
+    index of the task.
+
+    Returns the tasks, their filenames and whether each succeeded.
+    """
+    tasks, filenames = [], []
+    display = None if args.verbose else ProgressDisplay()
+    concurrent = args.jobs > 1
+    interrupted = journal is not None and os.path.exists(journal.path)
+
+    def Perform(group):
+        log_path = None
+        if concurrent:
+            for i in group:
+                print('[dvdrip] Started: %s' % DescribeTask(tasks[i],
+                        title_count, filenames[i]))
+            if not args.dry_run:
+                log_path = filenames[group[0]] + '.log'
+        else:
+            for i in group:
+                print('=' * 78)
+                print(DescribeTask(tasks[i], title_count, filenames[i]))
+            print('-' * 78)
+        try:
+            PerformTaskGroup(dvd, tasks, filenames, group, args.dry_run,
+                             args.verbose, args.no_subtitles,
+                             log_path=log_path, display=display)
+        except subprocess.CalledProcessError as exc:
+            if log_path:
+                warn("Failed to encode title %d (exit status %d), see %r."
+                     % (tasks[group[0]].title.number, exc.returncode,
+                        log_path))
+            else:
+                warn("Failed to encode title %d (exit status %d), skipping."
+                     % (tasks[group[0]].title.number, exc.returncode))
+            return False
+        if log_path:
+            os.remove(log_path)
+        if journal:
+            for i in group:
+                journal.MarkDone(i)
+        if on_complete and not args.dry_run:
+            for i in group:
+                on_complete(i)
+        return True
+
+    from concurrent.futures import ThreadPoolExecutor
+    submitted = []
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        for title in title_stream:
+            title_tasks = tuple(ConstructTasks([title], args.chapter_split))
+            title_filenames = TaskFilenames(title_tasks, args.output,
+                    dry_run=args.dry_run, metadata=metadata, multiple=True)
+            # Don't stomp on existing files, or on files of earlier titles.
+            for filename in title_filenames:
+                if filename in filenames:
+                    raise UserError("multiple tasks use same filename")
+                if os.path.exists(filename):
+                    if interrupted:
+                        raise UserError('%r already exists (use --resume to '
+                                        'continue an interrupted rip)'
+                                        % filename)
+                    raise UserError('%r already exists' % filename)
+            first = len(tasks)
+            tasks += title_tasks
+            filenames += title_filenames
+            if journal:
+                journal.Add(title_tasks, title_filenames)
+            for group in GroupTasks(title_tasks, args.split_mode):
+                group = [first + i for i in group]
+                submitted.append((group, executor.submit(Perform, group)))
+
+    results = [False] * len(tasks)
+    for group, future in submitted:
+        if future.result():
+            for i in group:
+                results[i] = True
+    return tasks, filenames, results
+
+# Daemon mode
+
+DAEMON_POLL_SECONDS = 2
+
+# Roughly how many cores one x265 encode of a DVD keeps busy.
+CORES_PER_ENCODE = 8
+
+def DiscOutputName(device, mountpoint):
+    """
+    Returns a name for the output directory of the disc in device, made of
+    its volume label and fingerprint so that different discs with the same
+    label don't collide.
+    """
+    label = re.sub(r'[^\w.-]+', '_', disc_label(device) or '').strip('_.')
+    try:
+        fingerprint = DiscFingerprint(mountpoint)
+    except OSError:
+        fingerprint = None
+    if not fingerprint:
+        fingerprint = '%08x' % int(time.time())
+    return '%s-%s' % (label or 'DVD', fingerprint[:8])
+
+def RipDrive(args, device):
+    """
+    Rips the disc in device into its own directory under args.output, then
+    ejects it. Returns whether the rip succeeded.
+    """
+    try:
+        mount_dir = mount_device_readonly(device,
+                                          timeout_sec=args.mount_timeout)
+    except RuntimeError as exc:
+        warn(str(exc))
+        return False
+    try:
+        disc_args = argparse.Namespace(**vars(args))
+        disc_args.input = device
+        disc_args.output = os.path.join(args.output,
+                                        DiscOutputName(device, mount_dir))
+        # Nobody is around to answer the TMDb prompt, so only look up
+        # metadata if it can be matched automatically, by the disc's label.
+        disc_args.no_metadata = not args.auto_metadata
+        label = disc_label(device)
+        disc_args.title_search = label and disc_search_name(label)
+        print('[dvdrip] %s: ripping into %r' % (device, disc_args.output))
+        try:
+            succeeded = RipDisc(disc_args)
+        except (UserError, RuntimeError, OSError,
+                subprocess.CalledProcessError) as exc:
+            warn('%s: %s' % (device, getattr(exc, 'message', exc)))
+            EjectDisc(mount_dir)
+            return False
+        except Exception as exc:
+            warn('%s: %s: %s' % (device, type(exc).__name__, exc))
+            EjectDisc(mount_dir)
+            return False
+        print('[dvdrip] %s: %s' % (device, 'done' if succeeded else
+                                   'done, with failed encodes'))
+        return succeeded
+    finally:
+        unmount(mount_dir)
+
+def RunDaemon(args):
+    """
+    Watches all optical drives and rips each disc that is inserted, running
+    up to args.parallel_discs rips at once.
+
+    A drive is watched again once its disc has been removed.
+    """
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output, exist_ok=True)
+    uevents = open_uevent_socket()
+    busy = {}
+    # Drives whose disc has been ripped, but not yet taken out.
+    finished = set()
+    print('[dvdrip] Watching %s for discs, ripping up to %d at once...'
+          % (', '.join(optical_drives()) or 'optical drives',
+             args.parallel_discs))
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=args.parallel_discs) as executor:
+        while True:
+            for device, future in list(busy.items()):
+                if future.done():
+                    del busy[device]
+                    finished.add(device)
+                    try:
+                        future.result()
+                    except Exception as exc:
+                        # RipDrive handles rip failures itself, so this is
+                        # something like a failed unmount.
+                        warn('%s: %s: %s' % (device, type(exc).__name__, exc))
+                        EjectDisc(device)
+            for device, has_media in probe_optical_drives().items():
+                if device in busy:
+                    continue
+                if device in finished:
+                    if not has_media:
+                        finished.discard(device)
+                elif has_media:
+                    print('[dvdrip] %s: disc inserted' % device)
+                    busy[device] = executor.submit(RipDrive, args, device)
+            wait_for_uevent(uevents, DAEMON_POLL_SECONDS)
+
+# Batch mode
+
+BATCH_SUMMARY_NAME = 'dvdrip-batch-summary.json'
+
+BatchResult = namedtuple('BatchResult',
+        'source output succeeded error seconds source_bytes')
+
+def IsIsoFile(path):
+    return path.lower().endswith('.iso') and os.path.isfile(path)
+
+def FindBatchSources(patterns):
+    """
+    Returns the ISO files and DVD folders (folders with a VIDEO_TS
+    directory) found by expanding each glob pattern in patterns and
+    searching any directories they name.
+    """
+    sources = set()
+    for pattern in patterns:
+        paths = glob.glob(pattern)
+        if not paths:
+            raise UserError('%r matches nothing' % pattern)
+        for path in paths:
+            if IsIsoFile(path) or FindVideoTs(path) is not None:
+                sources.add(path)
+            elif os.path.isdir(path):
+                for dirpath, dirnames, filenames in os.walk(path):
+                    if FindVideoTs(dirpath) is not None:
+                        sources.add(dirpath)
+                        dirnames[:] = []
+                        continue
+                    dirnames.sort()
+                    sources.update(os.path.join(dirpath, name)
+                                   for name in filenames
+                                   if IsIsoFile(os.path.join(dirpath, name)))
+    return sorted(os.path.normpath(source) for source in sources)
+
+def BatchOutputNames(sources):
+    """
+    Returns an output name for each source, based on its file or folder name
+    and made unique by numbering.
+    """
+    names = []
+    seen = {}
+    for source in sources:
+        base = os.path.basename(source)
+        if base.upper() == 'VIDEO_TS':
+            base = os.path.basename(os.path.dirname(source))
+        elif IsIsoFile(source):
+            base = os.path.splitext(base)[0]
+        base = base or 'DVD'
+        seen[base] = seen.get(base, 0) + 1
+        names.append(base if seen[base] == 1 else
+                     '%s-%d' % (base, seen[base]))
+    return names
+
+def SourceBytes(source):
+    if os.path.isfile(source):
+        return os.path.getsize(source)
+    video_ts = FindVideoTs(source)
+    return sum(os.path.getsize(os.path.join(video_ts, name))
+               for name in os.listdir(video_ts))
+
+def RipBatchSource(args, source, output):
+    """
+    Rips one ISO file or DVD folder into output, loop-mounting ISO files
+    read-only. Returns a BatchResult.
+    """
+    start = time.time()
+    mount_dir = None
+    error = None
+    succeeded = False
+    source_bytes = 0
+    try:
+        source_bytes = SourceBytes(source)
+        disc_args = argparse.Namespace(**vars(args))
+        disc_args.input = source
+        if IsIsoFile(source):
+            mount_dir = mount_device_readonly(source, loop=True,
+                    timeout_sec=args.mount_timeout)
+            disc_args.input = mount_dir
+        disc_args.output = output
+        # Metadata is matched automatically by the output name, or not at
+        # all, since nobody is around to answer the TMDb prompt.
+        disc_args.no_metadata = not args.auto_metadata
+        disc_args.title_search = None
+        disc_args.no_eject = True
+        print('[dvdrip] Ripping %r into %r' % (source, output))
+        succeeded = RipDisc(disc_args)
+        if not succeeded:
+            error = 'some titles failed to encode'
+    except (UserError, RuntimeError, OSError,
+            subprocess.CalledProcessError) as exc:
+        error = str(getattr(exc, 'message', exc))
+        warn('%s: %s' % (source, error))
+    except Exception as exc:
+        # Anything else (eg: a scan that can't be parsed) fails this source
+        # only, not the whole batch.
+        error = '%s: %s' % (type(exc).__name__, exc)
+        warn('%s: %s' % (source, error))
+    finally:
+        if mount_dir:
+            unmount(mount_dir)
+    return BatchResult(source, output, succeeded, error,
+                       time.time() - start, source_bytes)
+
+def RunBatch(args):
+    """
+    Rips every ISO file and DVD folder found by args.batch into its own
+    output under args.output, up to args.parallel_discs at once, then
+    prints a summary and writes it to the output directory as JSON.
+
+    Returns whether every source was ripped successfully.
+    """
+    sources = FindBatchSources(args.batch)
+    if not sources:
+        raise UserError('No ISO files or VIDEO_TS folders found')
+    outputs = [os.path.join(args.output, name)
+               for name in BatchOutputNames(sources)]
+    print('[dvdrip] Found %d discs, ripping up to %d at once.'
+          % (len(sources), args.parallel_discs))
+    start = time.time()
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=args.parallel_discs) as executor:
+        results = list(executor.map(RipBatchSource,
+                                    [args] * len(sources), sources, outputs))
+    elapsed = time.time() - start
+
+    succeeded = [r for r in results if r.succeeded]
+    total_bytes = sum(r.source_bytes for r in succeeded)
+    print('=' * 78)
+    for r in results:
+        print('%-6s %s  %r%s' % ('ok' if r.succeeded else 'FAILED',
+                                 Duration.from_seconds(r.seconds), r.source,
+                                 '' if r.succeeded else ': ' + r.error))
+    print('-' * 78)
+    print('%d of %d discs ripped in %s (%.1f MB/s, %.1f discs/hour)'
+          % (len(succeeded), len(results), Duration.from_seconds(elapsed),
+             total_bytes / 1e6 / max(elapsed, 1),
+             len(succeeded) * 3600 / max(elapsed, 1)))
+
+    if not args.dry_run:
+        os.makedirs(args.output, exist_ok=True)
+        summary_path = os.path.join(args.output, BATCH_SUMMARY_NAME)
+        with open(summary_path, 'w', encoding=CHAR_ENCODING) as f:
+            json.dump({
+                'seconds': elapsed,
+                'succeeded': len(succeeded),
+                'failed': len(results) - len(succeeded),
+                'source_bytes': total_bytes,
+                'discs': [r._asdict() for r in results],
+            }, f, indent=1)
+        print('[dvdrip] Summary written to %r' % summary_path)
+    return len(succeeded) == len(results)
+
 def main():
     args = ParseArgs()
+    if args.daemon:
+        RunDaemon(args)
+    elif args.batch:
+        if not RunBatch(args):
+            sys.exit(1)
+    else:
+        RipDisc(args)
+
+def RipDisc(args):
+    """
+    Scans or rips the disc at args.input, as asked for by the command line
+    in args. Returns whether everything was encoded successfully.
+    """
     # If input is a block device (e.g. /dev/sr0), convert it to a mountpoint
     mounted_temp_dir = None
+    device = None
+    eject_thread = None
+    eject_lock = threading.Lock()
+    eject_staged = False
+    staged = False
+    succeeded = True
+
+    def StartEject():
+        # Lets the disc go in the background, once.
+        nonlocal eject_thread
+        with eject_lock:
+            if eject_thread is None:
+                eject_thread = threading.Thread(target=dvd.Eject)
+                eject_thread.start()
+
+    # Start the TMDb search now, so that it runs while the disc is mounted
+    # and scanned.
+    prefetched = None
+    query = metadata_query(args)
+    if query and not args.no_metadata and not query.isdigit():
+        prefetched = prefetch_tmdb_search(query, year=args.year,
+                                          is_tv=args.tv)
 
     if is_block_device(args.input):
+        device = args.input
         mp = find_mountpoint(args.input)
         if mp:
             args.input = mp
@@ -1171,104 +4082,191 @@ def main():
 
     try:
         dvd = DVD(args.input, args.verbose, args.mount_timeout)
+        if args.stage_dir and not args.dry_run and not args.scan:
+            staged = dvd.Stage(args.stage_dir, args.verbose)
+            if staged and not args.no_eject:
+                # Everything from here on reads the staged copy, but the
+                # disc stays in the drive until an encode of the copy has
+                # succeeded.
+                if mounted_temp_dir:
+                    unmount(mounted_temp_dir)
+                    mounted_temp_dir = None
+                    dvd.disc_path = device
+                eject_staged = True
         print('Reading from %r' % dvd.mountpoint)
         title_numbers = parse_titles_arg(args.titles)
-        titles = tuple(dvd.ScanTitles(title_numbers, args.verbose))
+        title_stream = None
+        if CanStreamTitles(args, title_numbers):
+            # Encode each title as soon as it has been scanned, instead of
+            # scanning them all first.
+            titles = None
+            title_stream = ScanTitleStream(dvd, title_numbers, args)
+        else:
+            titles = CachedScanTitles(dvd, title_numbers, args.verbose,
+                    rescan=args.rescan, single_pass=not args.per_title_scan,
+                    scanner=args.scanner, jobs=args.scan_jobs)
 
         if args.scan:
-            # Fetch metadata for scan display if available
-            metadata = None
-            if not args.no_metadata:
-                try:
-                    if args.title_search:
-                        # User provided a search query
-                        print(f"[dvdrip] Searching TMDb for '{args.title_search}'...")
-                        metadata = get_metadata_from_tmdb(
-                            search_query=args.title_search,
-                            year=args.year,
-                            is_tv=args.tv
-                        )
-                    elif TMDB_AVAILABLE and load_tmdb_api_key():
-                        # API is available, offer to search
-                        print("\n[dvdrip] TMDb metadata available. Search for title info?")
-                        response = input("Search TMDb? (y/n): ").strip().lower()
-                        if response in ('y', 'yes'):
-                            metadata = get_metadata_from_tmdb(
-                                year=args.year,
-                                is_tv=args.tv
-                            )
-                except Exception as e:
-                    warn(f"Metadata lookup failed: {e}")
-
+            metadata = lookup_metadata(args, "Search for title info?",
+                                       prefetched, titles)
             DisplayScan(titles, metadata=metadata)
         else:
+            if args.dedupe or args.min_title_seconds:
+                titles = FilterTitles(titles, dvd.mountpoint,
+                        dedupe=args.dedupe,
+                        min_seconds=args.min_title_seconds)
+
             if args.main_feature and len(titles) > 1:
                 # TODO: make this affect scan as well
                 titles = [FindMainFeature(titles, args.verbose)]
 
-            if not titles:
+            if not titles and title_stream is None:
                 raise UserError("No titles to rip")
             else:
                 if not args.output:
                     raise UserError("No output specified")
 
-                # Fetch metadata from TMDb if requested
-                metadata = None
-                if not args.no_metadata:
-                    try:
-                        if args.title_search:
-                            # User provided a search query
-                            print(f"[dvdrip] Searching TMDb for '{args.title_search}'...")
-                            metadata = get_metadata_from_tmdb(
-                                search_query=args.title_search,
-                                year=args.year,
-                                is_tv=args.tv
-                            )
-                        elif TMDB_AVAILABLE and load_tmdb_api_key():
-                            # API is available, offer to search
-                            print("\n[dvdrip] TMDb metadata available. Search for better file naming?")
-                            response = input("Search TMDb? (y/n): ").strip().lower()
-                            if response in ('y', 'yes'):
-                                metadata = get_metadata_from_tmdb(
-                                    year=args.year,
-                                    is_tv=args.tv
-                                )
-
-                        if metadata:
-                            print(f"[dvdrip] Using metadata: {metadata['title']} ({metadata.get('year', 'unknown year')})")
-                    except Exception as e:
-                        warn(f"Metadata lookup failed: {e}")
-                        print("[dvdrip] Continuing with default naming...")
+                metadata = lookup_metadata(args,
+                        "Search for better file naming?", prefetched,
+                        titles or ())
+                if metadata:
+                    print(f"[dvdrip] Using metadata: {metadata['title']} ({metadata.get('year', 'unknown year')})")
 
                 print('Writing to %r' % args.output)
-                tasks = tuple(ConstructTasks(titles, args.chapter_split))
+                join = args.join or args.join_titles
+                source_join = None
+                if title_stream is not None:
+                    journal = None
+                    if not args.dry_run:
+                        journal = RipJournal(args.output + JOURNAL_SUFFIX,
+                                             DiscFingerprint(dvd.mountpoint),
+                                             [], [])
+                    tasks, filenames, results = RipTitleStream(dvd, args,
+                            title_stream, len(title_numbers), metadata,
+                            journal=journal,
+                            on_complete=(lambda i: StartEject())
+                                        if eject_staged else None)
+                    if not tasks:
+                        raise UserError("No titles to rip")
+                    succeeded = all(results)
+                    if journal and succeeded:
+                        journal.Remove()
+                    if args.join_titles:
+                        join_title_nums = ParseJoinTitles(args.join_titles)
+                    else:
+                        join_title_nums = {task.title.number
+                                           for task in tasks}
+                else:
+                    tasks = tuple(ConstructTasks(titles, args.chapter_split))
 
-                filenames = TaskFilenames(tasks, args.output, dry_run=args.dry_run, metadata=metadata)
-                # Don't stomp on existing files
-                for filename in filenames:
-                    if os.path.exists(filename):
-                        raise UserError('%r already exists' % filename)
+                    filenames = TaskFilenames(tasks, args.output, dry_run=args.dry_run, metadata=metadata)
 
-                PerformTasks(dvd, tasks, len(titles), filenames,
-                        dry_run=args.dry_run, verbose=args.verbose,
-                        no_subtitles=args.no_subtitles)
+                    if args.join_titles:
+                        join_title_nums = ParseJoinTitles(args.join_titles)
+                    else:
+                        join_title_nums = {title.number for title in titles}
+
+                    # Joining at the source encodes the joined titles once, as a
+                    # single stream, instead of encoding each of them and then
+                    # joining the results.
+                    if join and args.join_mode == 'source':
+                        join_titles = [title for title in titles
+                                       if title.number in join_title_nums]
+                        if args.keep_files:
+                            warn("--keep-files needs the individual files, "
+                                 "not joining at the source.")
+                        elif len(join_titles) >= 2:
+                            source_join = SourceJoinCells(
+                                    dvd.mountpoint,
+                                    [title.number for title in join_titles])
+                        if source_join is None:
+                            print('[dvdrip] Joining encoded files instead.')
+
+                    rip_tasks, rip_filenames = tasks, filenames
+                    if source_join:
+                        rip_tasks, rip_filenames = [], []
+                        for task, filename in zip(tasks, filenames):
+                            if task.title.number not in join_title_nums:
+                                rip_tasks.append(task)
+                                rip_filenames.append(filename)
+
+                    journal = None
+                    if not args.dry_run and rip_tasks:
+                        journal = RipJournal(args.output + JOURNAL_SUFFIX,
+                                             DiscFingerprint(dvd.mountpoint),
+                                             rip_tasks, rip_filenames)
+
+                    if args.resume and journal:
+                        if not journal.Load():
+                            print('[dvdrip] No journal found; judging '
+                                  'existing files by their duration.')
+                        remaining = ResumeTasks(journal, rip_tasks,
+                                                rip_filenames, args.verbose)
+                        print('[dvdrip] Resuming: %d of %d tasks left to encode.'
+                              % (len(remaining), len(rip_tasks)))
+                    else:
+                        # Don't stomp on existing files
+                        for filename in rip_filenames:
+                            if os.path.exists(filename):
+                                if journal and os.path.exists(journal.path):
+                                    raise UserError(
+                                            '%r already exists (use --resume to '
+                                            'continue an interrupted rip)'
+                                            % filename)
+                                raise UserError('%r already exists' % filename)
+                        remaining = range(len(rip_tasks))
+
+                    if journal:
+                        journal.Save()
+
+                    def TaskDone(i):
+                        if journal:
+                            journal.MarkDone(remaining[i])
+                        if eject_staged:
+                            StartEject()
+                    results = PerformTasks(dvd,
+                            [rip_tasks[i] for i in remaining], len(titles),
+                            [rip_filenames[i] for i in remaining],
+                            dry_run=args.dry_run, verbose=args.verbose,
+                            no_subtitles=args.no_subtitles, jobs=args.jobs,
+                            split_mode=args.split_mode,
+                            on_complete=TaskDone)
+                    succeeded = all(results)
+                    if journal and succeeded:
+                        journal.Remove()
+
+                    if source_join:
+                        joined_output = JoinedOutputName(filenames, metadata)
+                        print('=' * 78)
+                        print(f'[dvdrip] Encoding titles {sorted(join_title_nums)} into: {joined_output}')
+                        if os.path.exists(joined_output):
+                            warn(f"Joined output file already exists: {joined_output}")
+                        else:
+                            vts, cells = source_join
+                            try:
+                                dvd.RipJoinedSource(join_titles[0], vts, cells,
+                                        joined_output, args.dry_run, args.verbose,
+                                        no_subtitles=args.no_subtitles)
+                            except (subprocess.CalledProcessError, ValueError,
+                                    OSError) as exc:
+                                warn(f"Failed to encode joined titles: {exc}")
+                                succeeded = False
+
+                if not args.dry_run and not args.no_eject:
+                    # Nothing reads the disc from here on, so let it go
+                    # while the files are joined and cleaned up.
+                    StartEject()
+
+                if staged and succeeded and not args.keep_stage:
+                    RemoveStagedCopy(dvd.mountpoint)
 
                 # Handle joining if requested
-                if (args.join or args.join_titles) and not args.dry_run:
+                if join and not source_join and not args.dry_run:
                     print('=' * 78)
                     print('[dvdrip] Joining files...')
 
                     # Determine which files to join
                     if args.join_titles:
-                        # Parse the join-titles argument
-                        join_title_nums = set()
-                        for part in args.join_titles.split(','):
-                            part = part.strip()
-                            if part.isdigit():
-                                join_title_nums.add(int(part))
-                            else:
-                                warn(f"Invalid title number in --join-titles: {part}")
-
                         # Filter filenames to only include specified titles
                         files_to_join = []
                         for task, filename in zip(tasks, filenames):
@@ -1279,18 +4277,7 @@ def main():
                         files_to_join = list(filenames)
 
                     if len(files_to_join) >= 2:
-                        # Generate output filename for joined file (same directory as individual files)
-                        output_dir = os.path.dirname(filenames[0]) if filenames else '.'
-                        if not output_dir:
-                            output_dir = '.'
-
-                        if metadata and metadata.get('title'):
-                            base_name = sanitize_filename(metadata['title'])
-                            if metadata.get('year'):
-                                base_name = f"{base_name} ({metadata['year']})"
-                            joined_output = os.path.join(output_dir, f"{base_name} - Joined.mp4")
-                        else:
-                            joined_output = os.path.join(output_dir, "Joined.mp4")
+                        joined_output = JoinedOutputName(filenames, metadata)
 
                         # Check if joined output already exists
                         if os.path.exists(joined_output):
@@ -1329,11 +4316,12 @@ def main():
                             warn("No files matched --join-titles specification.")
 
                 print('=' * 78)
-                if not args.dry_run:
-                    dvd.Eject()
     finally:
+        if eject_thread:
+            eject_thread.join()
         if mounted_temp_dir:
             unmount(mounted_temp_dir)
+    return succeeded
 
 def warn(msg):
         print('warning: %s' % (msg,), file=sys.stderr)
@@ -0,0 +1,216 @@
+"""
+Tests the IFO reader against small synthetic VIDEO_TS.IFO and VTS_xx_0.IFO
+files.
+"""
+
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dvdrip
+
+SECTOR = dvdrip.DVD_SECTOR_SIZE
+
+# Cell block flags: the first, a middle and the last cell of an angle block.
+ANGLE_FIRST, ANGLE_MIDDLE, ANGLE_LAST = 0x50, 0x90, 0xD0
+
+
+def Bcd(n):
+    return ((n // 10) << 4) | (n % 10)
+
+
+def DvdTime(hours, minutes, seconds, frames=0, pal=True):
+    return bytes([Bcd(hours), Bcd(minutes), Bcd(seconds),
+                  ((1 if pal else 3) << 6) | Bcd(frames)])
+
+
+def MakeVmg(titles):
+    """
+    Builds a VIDEO_TS.IFO whose title search pointer table lists titles, as
+    (parts, vts, vts_ttn) triples.
+    """
+    vmg = bytearray(2 * SECTOR)
+    vmg[:12] = b'DVDVIDEO-VMG'
+    struct.pack_into('>I', vmg, 0xC4, 1)
+    struct.pack_into('>H', vmg, SECTOR, len(titles))
+    for i, (parts, vts, vts_ttn) in enumerate(titles):
+        struct.pack_into('>BBHHBBI', vmg, SECTOR + 8 + 12 * i,
+                         0, 1, parts, 0, vts, vts_ttn, 0)
+    return bytes(vmg)
+
+
+def MakePgc(programs, cells, audio_control, subp_control):
+    """
+    Builds a program chain. cells are (time, first sector, last sector,
+    flags) tuples.
+    """
+    program_map = 0xEC
+    cell_playback = program_map + len(programs)
+    pgc = bytearray(cell_playback + 24 * len(cells))
+    pgc[2], pgc[3] = len(programs), len(cells)
+    struct.pack_into('>8H', pgc, 0x0C,
+                     *(list(audio_control) + [0] * 8)[:8])
+    struct.pack_into('>32I', pgc, 0x1C,
+                     *(list(subp_control) + [0] * 32)[:32])
+    struct.pack_into('>HH', pgc, 0xE6, program_map, cell_playback)
+    pgc[program_map:cell_playback] = bytes(programs)
+    for i, (time, first_sector, last_sector, flags) in enumerate(cells):
+        offset = cell_playback + 24 * i
+        pgc[offset] = flags
+        pgc[offset + 4:offset + 8] = time
+        struct.pack_into('>I', pgc, offset + 8, first_sector)
+        struct.pack_into('>I', pgc, offset + 20, last_sector)
+    return bytes(pgc)
+
+
+def MakeVts(video, audio, subpictures, parts, pgcs):
+    """
+    Builds a VTS_xx_0.IFO.
+
+    video is the two bytes of video attributes, audio and subpictures the
+    attributes of each stream, parts the (pgcn, pgn) pairs of each title of
+    the set, and pgcs the program chains from MakePgc.
+    """
+    vts = bytearray(SECTOR)
+    vts[:12] = b'DVDVIDEO-VTS'
+    struct.pack_into('>II', vts, 0xC8, 1, 2)
+    vts[0x200:0x202] = video
+    struct.pack_into('>H', vts, 0x202, len(audio))
+    for i, attributes in enumerate(audio):
+        vts[0x204 + 8 * i:0x204 + 8 * i + len(attributes)] = attributes
+    struct.pack_into('>H', vts, 0x254, len(subpictures))
+    for i, attributes in enumerate(subpictures):
+        vts[0x256 + 6 * i:0x256 + 6 * i + len(attributes)] = attributes
+
+    ptt = bytearray(8 + 4 * len(parts))
+    offset = len(ptt)
+    offsets = []
+    for title_parts in parts:
+        offsets.append(offset)
+        for pgcn, pgn in title_parts:
+            ptt += struct.pack('>HH', pgcn, pgn)
+            offset += 4
+    struct.pack_into('>HHI', ptt, 0, len(parts), 0, len(ptt) - 1)
+    struct.pack_into('>%dI' % len(offsets), ptt, 8, *offsets)
+    vts += ptt + bytes(SECTOR - len(ptt))
+
+    pgci = bytearray(8 + 8 * len(pgcs))
+    struct.pack_into('>H', pgci, 0, len(pgcs))
+    for i, pgc in enumerate(pgcs):
+        struct.pack_into('>I', pgci, 8 + 8 * i + 4, len(pgci))
+        pgci += pgc
+    vts += pgci
+    return bytes(vts)
+
+
+def AudioAttributes(codec, lang, channels, rate_96k=False):
+    return bytes([(codec << 5) | (1 << 2),
+                  ((1 if rate_96k else 0) << 4) | (channels - 1)]) + lang
+
+
+class IfoTest(unittest.TestCase):
+    def setUp(self):
+        self.disc = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.disc)
+        video_ts = os.path.join(self.disc, 'VIDEO_TS')
+        os.mkdir(video_ts)
+
+        # Title set 1 is PAL 16:9, with a two chapter title whose second
+        # chapter has an angle block, and a one chapter title.
+        pal = MakeVts(
+            video=bytes([(1 << 4) | (3 << 2), 0]),
+            audio=[AudioAttributes(0, b'en', 6),
+                   AudioAttributes(6, b'fr', 2, rate_96k=True),
+                   AudioAttributes(0, b'de', 2)],
+            subpictures=[bytes([1, 0]) + b'de', bytes([1, 0]) + b'xx'],
+            parts=[[(1, 1), (1, 2)], [(2, 1)]],
+            pgcs=[
+                MakePgc([1, 2], [
+                    (DvdTime(0, 10, 0), 0, 99, 0),
+                    (DvdTime(0, 1, 30, 13), 100, 199, ANGLE_FIRST),
+                    (DvdTime(0, 1, 30, 13), 200, 299, ANGLE_MIDDLE),
+                    (DvdTime(0, 1, 30, 13), 300, 399, ANGLE_LAST),
+                    (DvdTime(0, 3, 0), 400, 499, 0)],
+                    # The German audio and second subpicture aren't
+                    # available in this program chain.
+                    [0x8000, 0x8100, 0], [0x80000000, 0]),
+                MakePgc([1], [(DvdTime(0, 0, 8), 500, 509, 0)],
+                        [0x8000], [])])
+        # Title set 2 is NTSC 4:3 with line21 closed captions.
+        ntsc = MakeVts(
+            video=bytes([0, 0x80]),
+            audio=[AudioAttributes(0, b'en', 2)],
+            subpictures=[],
+            parts=[[(1, 1)]],
+            pgcs=[MakePgc([1], [(DvdTime(0, 0, 59, 15, pal=False),
+                                 0, 99, 0)], [0x8000], [])])
+
+        for name, data in (
+                ('VIDEO_TS.IFO', MakeVmg([(2, 1, 1), (1, 1, 2), (1, 2, 1)])),
+                ('VTS_01_0.IFO', pal),
+                ('VTS_02_0.IFO', ntsc)):
+            with open(os.path.join(video_ts, name), 'wb') as f:
+                f.write(data)
+
+    def Titles(self):
+        title_count, titles = dvdrip.IfoTitles(self.disc)
+        return title_count, {title.number: title for title in titles}
+
+    def test_title_count(self):
+        title_count, titles = self.Titles()
+        self.assertEqual(title_count, 3)
+        self.assertEqual(sorted(titles), [1, 2, 3])
+
+    def test_frame_times(self):
+        self.assertAlmostEqual(
+                dvdrip.ParseDvdTime(DvdTime(0, 1, 30, 13), 0), 90.52)
+        self.assertAlmostEqual(
+                dvdrip.ParseDvdTime(DvdTime(0, 0, 59, 15, pal=False), 0),
+                59 + 15 * 1001 / 30000)
+
+    def test_chapter_durations(self):
+        _, titles = self.Titles()
+        # Only the first cell of the angle block counts.
+        self.assertEqual(
+                [str(chapter.duration) for chapter in titles[1].chapters],
+                ['00:10:00', '00:04:31'])
+        self.assertEqual(str(titles[1].duration), '00:14:31')
+        self.assertEqual(str(titles[2].duration), '00:00:08')
+        self.assertEqual(str(titles[3].duration), '00:01:00')
+
+    def test_audio_tracks(self):
+        _, titles = self.Titles()
+        self.assertEqual(
+                [(a.number, a.lang, a.codec, a.channels, a.iso639_2,
+                  a.extras) for a in titles[1].audio_tracks],
+                [(1, 'English', 'AC3', '5.1', 'eng', '48000Hz'),
+                 (2, 'French', 'DTS', '2.0', 'fre', '96000Hz')])
+
+    def test_subtitle_tracks(self):
+        _, titles = self.Titles()
+        self.assertEqual(
+                [s.info for s in titles[1].subtitle_tracks],
+                ['German (iso639-2: ger) (Bitmap)(VOBSUB)'])
+        self.assertEqual(titles[2].subtitle_tracks, ())
+
+    def test_closed_captions(self):
+        _, titles = self.Titles()
+        self.assertEqual(
+                titles[3].subtitle_tracks,
+                (dvdrip.SubtitleTrack(1, 'English, Closed Caption '
+                                      '(iso639-2: eng) (Text)(CC608)'),))
+
+    def test_size(self):
+        _, titles = self.Titles()
+        self.assertEqual(titles[1].size, dvdrip.Size(720, 576, 64, 45, 25.0))
+        self.assertEqual(titles[3].size,
+                         dvdrip.Size(720, 480, 8, 9, 30000 / 1001))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+Guards dvdrip's startup time, as reported by python -X importtime.
+"""
+
+import os
+import re
+import subprocess
+import sys
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time of dvdrip, in microseconds. It imports in a few tens
+# of milliseconds; the budget leaves room for slow machines, but not for an
+# eager import of something like requests.
+IMPORT_BUDGET_US = 150000
+
+# Modules that are only needed for some options, and must be imported lazily.
+LAZY_MODULES = ('tmdbsimple', 'requests', 'difflib', 'concurrent.futures')
+
+IMPORTTIME_RE = re.compile(r'^import time:\s*(\d+) \|\s*(\d+) \|( *)(\S+)$')
+
+
+def ImportTimes():
+    """
+    Imports dvdrip in a fresh interpreter, and returns a dict mapping each
+    module imported to its cumulative import time in microseconds.
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    p = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                        'import dvdrip'], cwd=REPO_DIR, env=env,
+                       capture_output=True, text=True, check=True)
+    result = {}
+    for line in p.stderr.splitlines():
+        m = IMPORTTIME_RE.match(line)
+        if m:
+            result[m.group(4)] = int(m.group(2))
+    return result
+
+
+class StartupTest(unittest.TestCase):
+    def test_import_time_within_budget(self):
+        # Take the best of a few runs, to keep a busy machine from failing
+        # the test.
+        best = min(ImportTimes()['dvdrip'] for _ in range(3))
+        self.assertLess(best, IMPORT_BUDGET_US,
+                        'importing dvdrip took %d us' % best)
+
+    def test_optional_modules_not_imported(self):
+        imported = ImportTimes()
+        for module in LAZY_MODULES:
+            self.assertNotIn(module, imported)
+
+
+if __name__ == '__main__':
+    unittest.main()
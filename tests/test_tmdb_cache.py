@@ -0,0 +1,96 @@
+"""
+Tests the TMDb lookups against a local stand-in for the TMDb API.
+"""
+
+import http.server
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dvdrip
+
+MATRIX = {'id': 603, 'title': 'The Matrix', 'release_date': '1999-03-31'}
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    # Keep-alive, so that a reused session shows up as a reused connection.
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.client_address))
+        body = json.dumps({'page': 1, 'results': [MATRIX]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def UnusedPort():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@unittest.skipUnless(dvdrip.TMDB_AVAILABLE, 'tmdbsimple not installed')
+class TmdbCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                      StandInHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        for patch in (
+                mock.patch.object(dvdrip, 'CACHE_DIR', cache_dir),
+                mock.patch.dict(os.environ, {
+                    'TMDB_API_KEY': 'test-key',
+                    'TMDB_BASE_URI': 'http://127.0.0.1:%d/3'
+                                     % self.server.server_port})):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_cache_hit_makes_no_request(self):
+        self.assertEqual(dvdrip.search_tmdb('The Matrix', year=1999),
+                         [MATRIX])
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(dvdrip.search_tmdb('the matrix ', year=1999),
+                         [MATRIX])
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_expired_entry_served_when_offline(self):
+        dvdrip.search_tmdb('The Matrix')
+        offline = 'http://127.0.0.1:%d/3' % UnusedPort()
+        with mock.patch.object(dvdrip, 'TMDB_CACHE_TTL_SECONDS', 0), \
+                mock.patch.dict(os.environ, {'TMDB_BASE_URI': offline}):
+            self.assertEqual(dvdrip.search_tmdb('The Matrix'), [MATRIX])
+
+    def test_session_reused(self):
+        session = dvdrip.tmdb_module().REQUESTS_SESSION
+        self.assertIsNotNone(session)
+        dvdrip.search_tmdb('The Matrix')
+        dvdrip.search_tmdb('The Matrix Reloaded')
+        self.assertIs(dvdrip.tmdb_module().REQUESTS_SESSION, session)
+        self.assertEqual(len(self.server.requests), 2)
+        # Both requests went over the same kept-alive connection.
+        self.assertEqual(len({address for _, address
+                              in self.server.requests}), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()